@@ -1,14 +1,32 @@
 import requests
 import pandas as pd
-import numpy as np
 import folium
 from folium import plugins
 import yaml
 import os
 import json
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import seaborn as sns
+from manifest import Manifest, hash_inputs
+from plot_rendering import plots_config, render_plots
+from location_store import load_coordinates
+from temperature_dataset import DEFAULT_DATASET_DIR, columnar_frame, read_temperature_dataset, write_temperature_dataset
+from temperature_stats import compute_temperature_stats, location_table, seasonal_statistics_table, temperature_summary
+from temperature_store import TemperatureStore, fetch_with_store, store_from_config
+from weather_grid import OPEN_METEO_GRID_DEG, fetch_per_cell
+
+MANIFEST_STAGE = "temperature"
+DAILY_VARIABLES = [
+    'temperature_2m_max', 'temperature_2m_min', 'temperature_2m_mean',
+    'relative_humidity_2m_mean', 'precipitation_sum'
+]
+RAW_COLUMNS = ['date', 'temperature_max', 'temperature_min', 'temperature_mean', 'humidity', 'precipitation']
+STATISTICS_AGGREGATIONS = {
+    'temperature_mean': ['mean', 'min', 'max'],
+    'temperature_max': ['mean', 'min', 'max'],
+    'temperature_min': ['mean', 'min', 'max'],
+    'humidity': ['mean', 'min', 'max'],
+    'precipitation': ['sum', 'mean', 'max']
+}
 
 
 def load_config(config_path: str) -> dict:
@@ -20,30 +38,41 @@ def create_directories(output_path: str):
     os.makedirs(output_path, exist_ok=True)
 
 
-def get_coordinates_from_yaml(coordinates_path: str) -> list:
-    with open(coordinates_path, 'r') as file:
-        coordinates_data = yaml.safe_load(file)
-        coordinates_list = []
-        for aim_id, data in coordinates_data.items():
-            coordinates_list.append({
-                'aim_id': aim_id,
-                'address': data.get('address'),
-                'latitude': data.get('latitude'),
-                'longitude': data.get('longitude'),
-                'timestamp': data.get('timestamp')
-            })
-        return coordinates_list
+def get_coordinates_from_yaml(coordinates_path: str, config_path: str = 'config.yaml') -> list:
+    return coordinates_list_from_data(load_coordinates(coordinates_path, config_path))
 
 
-def get_historical_temperature(lat: float, lng: float) -> pd.DataFrame:
+def coordinates_list_from_data(coordinates_data: dict) -> list:
+    coordinates_list = []
+    for aim_id, data in coordinates_data.items():
+        coordinates_list.append({
+            'aim_id': aim_id,
+            'address': data.get('address'),
+            'latitude': data.get('latitude'),
+            'longitude': data.get('longitude'),
+            'timestamp': data.get('timestamp')
+        })
+    return coordinates_list
+
+
+def temperature_window() -> tuple:
     end_date = datetime.now()
     start_date = end_date - timedelta(days=5*365)
+    return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+
+
+def get_historical_temperature(lat: float, lng: float, start_date: str = None, end_date: str = None,
+                               store: TemperatureStore = None) -> pd.DataFrame:
+    if start_date is None or end_date is None:
+        start_date, end_date = temperature_window()
+    if store is not None:
+        # Only the dates the store does not hold yet are requested from the archive.
+        return fetch_with_store(store, lat, lng, start_date, end_date, RAW_COLUMNS[1:], get_historical_temperature)
     url = (
         f"https://archive-api.open-meteo.com/v1/archive?"
         f"latitude={lat}&longitude={lng}"
-        f"&start_date={start_date.strftime('%Y-%m-%d')}&end_date={end_date.strftime('%Y-%m-%d')}"
-        f"&daily=temperature_2m_max,temperature_2m_min,temperature_2m_mean,"
-        f"relative_humidity_2m_mean,precipitation_sum"
+        f"&start_date={start_date}&end_date={end_date}"
+        f"&daily={','.join(DAILY_VARIABLES)}"
         f"&timezone=auto"
     )
 
@@ -77,138 +106,131 @@ def create_heatmap(temperature_data: list, output_path: str) -> str:
     return file_path
 
 
-def save_temperature_data(all_data, detailed_data, output_path):
+def save_temperature_data(all_data, stats, locations, output_path, aim_ids=None, output_format='csv') -> dict:
+    """Writes the summary JSON, per-aim daily data (only for `aim_ids` if given) and the statistics CSV.
+
+    `stats` is the result of compute_temperature_stats and `locations` the aim location table. With
+    output_format='parquet' the daily data goes to one Parquet dataset partitioned by aim and year
+    instead of one CSV per aim. Returns {aim_id: path} for the daily data written.
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_paths = {}
+    dataset_path = os.path.join(output_path, DEFAULT_DATASET_DIR)
 
     with open(os.path.join(output_path, f"temperature_summary_{timestamp}.json"), 'w') as f:
         json.dump(all_data, f, indent=2)
 
-    for aim_id, df in detailed_data.items():
-        location = next((d for d in all_data if d['aim_id'] == aim_id), {})
-        df['aim_id'] = aim_id
-        df['address'] = location.get('address', '')
-        df['latitude'] = location.get('lat')
-        df['longitude'] = location.get('lng')
-        df['month'] = df['date'].dt.month
-        df['year'] = df['date'].dt.year
-        df['season'] = df['month'].map({
-            12: 'Winter', 1: 'Winter', 2: 'Winter',
-            3: 'Spring', 4: 'Spring', 5: 'Spring',
-            6: 'Summer', 7: 'Summer', 8: 'Summer',
-            9: 'Autumn', 10: 'Autumn', 11: 'Autumn'
-        })
+    daily = stats['daily'].join(locations, on='aim_id')
+    if aim_ids is not None:
+        daily = daily[daily['aim_id'].isin(aim_ids)]
+
+    if output_format == 'parquet':
+        if not daily.empty:
+            write_temperature_dataset([columnar_frame(daily)], dataset_path)
+        csv_paths = dict.fromkeys(pd.unique(daily['aim_id']), dataset_path)
+    else:
+        columns = RAW_COLUMNS + ['aim_id', 'address', 'latitude', 'longitude', 'month', 'year', 'season']
+        for aim_id, df in daily.groupby('aim_id', sort=False):
+            csv_paths[aim_id] = os.path.join(output_path, f"temperature_data_{aim_id}_{timestamp}.csv")
+            df[columns].to_csv(csv_paths[aim_id], index=False)
+
+    seasonal_statistics_table(stats, locations, decimals=2).to_csv(
+        os.path.join(output_path, f"temperature_statistics_{timestamp}.csv"), index=False
+    )
+    return csv_paths
 
-        df.to_csv(os.path.join(output_path, f"temperature_data_{aim_id}_{timestamp}.csv"), index=False)
 
-    stats = []
-    for aim_id, df in detailed_data.items():
-        location = next((d for d in all_data if d['aim_id'] == aim_id), {})
-        stats_dict = {
-            'aim_id': aim_id,
-            'address': location.get('address'),
-            'latitude': location.get('lat'),
-            'longitude': location.get('lng')
-        }
-        grouped = df.groupby('season').agg({
-            'temperature_mean': ['mean', 'min', 'max'],
-            'temperature_max': ['mean', 'min', 'max'],
-            'temperature_min': ['mean', 'min', 'max'],
-            'humidity': ['mean', 'min', 'max'],
-            'precipitation': ['sum', 'mean', 'max']
-        }).round(2)
-        for season in grouped.index:
-            for metric, stats_set in grouped.loc[season].items():
-                stats_dict[f"{season.lower()}_{metric[0]}_{metric[1]}"] = stats_set
-        stats.append(stats_dict)
-
-    pd.DataFrame(stats).to_csv(os.path.join(output_path, f"temperature_statistics_{timestamp}.csv"), index=False)
-
-
-def create_trend_plots(detailed_data: dict, output_path: str):
+def create_trend_plots(stats: dict, output_path: str, aim_ids=None, preset: str = 'publication',
+                       max_workers: int = None) -> dict:
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    for aim_id, df in detailed_data.items():
-        df['month'] = df['date'].dt.month
-        df['year'] = df['date'].dt.year
-        df['season'] = df['month'].map({
-            12: 'Winter', 1: 'Winter', 2: 'Winter',
-            3: 'Spring', 4: 'Spring', 5: 'Spring',
-            6: 'Summer', 7: 'Summer', 8: 'Summer',
-            9: 'Autumn', 10: 'Autumn', 11: 'Autumn'
-        })
-
-        fig = plt.figure(figsize=(20, 12))
-
-        ax1 = plt.subplot(2, 2, 1)
-        yearly = df.groupby('year').agg({
-            'temperature_mean': ['mean', 'std'],
-            'temperature_max': ['mean', 'std'],
-            'temperature_min': ['mean', 'std']
-        })
-        for metric in ['temperature_mean', 'temperature_max', 'temperature_min']:
-            mean = yearly[metric]['mean']
-            std = yearly[metric]['std']
-            ax1.plot(mean.index, mean.values, marker='o', label=metric)
-            ax1.fill_between(mean.index, mean - 1.96 * std, mean + 1.96 * std, alpha=0.2)
-        ax1.set_title('Yearly Temperature Trends')
-        ax1.legend()
-        ax1.grid(True)
-
-        ax2 = plt.subplot(2, 2, 2)
-        sns.violinplot(data=df, x='season', y='temperature_mean', ax=ax2)
-        sns.boxplot(data=df, x='season', y='temperature_mean', ax=ax2, color='white')
-        ax2.set_title('Seasonal Temperature Distribution')
-
-        ax3 = plt.subplot(2, 2, 3)
-        monthly = df.groupby(['year', 'month'])['temperature_mean'].mean().reset_index()
-        for year in monthly['year'].unique():
-            y_data = monthly[monthly['year'] == year]
-            ax3.plot(y_data['month'], y_data['temperature_mean'], label=str(year))
-            z = np.polyfit(y_data['month'], y_data['temperature_mean'], 1)
-            ax3.plot(y_data['month'], np.poly1d(z)(y_data['month']), linestyle='--')
-        ax3.set_title('Monthly Temperature Patterns by Year')
-        ax3.legend()
-        ax3.grid(True)
-
-        ax4 = plt.subplot(2, 2, 4)
-        pivot = df.pivot_table(values='temperature_mean', index='year', columns='month', aggfunc='mean')
-        sns.heatmap(pivot, cmap=sns.diverging_palette(220, 10, as_cmap=True), ax=ax4, annot=True, fmt='.1f')
-        ax4.set_title('Temperature Changes Heatmap')
-
-        plt.tight_layout()
-        plot_path = os.path.join(output_path, f"temperature_trends_{aim_id}_{timestamp}.png")
-        plt.savefig(plot_path, dpi=300)
-        plt.close()
-
-
-def process_temperature_pipeline(config_path: str = 'config.yaml', coordinates_path: str = 'coordinates.yaml'):
+    jobs = {
+        aim_id: (
+            'trends',
+            (df[['season', 'temperature_mean']], stats['yearly'].loc[aim_id], stats['monthly'].loc[aim_id]),
+            os.path.join(output_path, f"temperature_trends_{aim_id}_{timestamp}")
+        )
+        for aim_id, df in stats['daily'].groupby('aim_id', sort=False)
+        if aim_ids is None or aim_id in aim_ids
+    }
+    return render_plots(jobs, preset, max_workers)
+
+
+def load_saved_temperature(path: str, aim_id: str = None) -> pd.DataFrame:
+    if os.path.isdir(path):
+        return read_temperature_dataset(path, aim_id, columns=RAW_COLUMNS)[RAW_COLUMNS]
+    return pd.read_csv(path, parse_dates=['date'])[RAW_COLUMNS]
+
+
+def process_temperature_pipeline(config_path: str = 'config.yaml', coordinates_path: str = 'coordinates.yaml',
+                                 coordinates_data: dict = None, manifest: Manifest = None) -> dict:
+    """Fetches, plots and saves temperatures for every aim.
+
+    With a manifest, aims whose location and date window are unchanged are reloaded from the
+    CSV written by the previous run instead of being fetched, plotted and written again.
+    """
     config = load_config(config_path)
     output_path = config.get('directories', {}).get('temperature_output', os.path.join('data', 'temperature_heatmaps'))
+    store = store_from_config(config)
+    output_format = config.get('temperature_output_format', 'csv')
     create_directories(output_path)
 
-    coordinates_list = get_coordinates_from_yaml(coordinates_path)
+    if coordinates_data is not None:
+        coordinates_list = coordinates_list_from_data(coordinates_data)
+    else:
+        coordinates_list = get_coordinates_from_yaml(coordinates_path, config_path)
+    locations = location_table(coordinates_list)
     temperature_data = []
-    detailed_data = {}
+    start_date, end_date = temperature_window()
+    digests = {}
+    frames = {}
 
     for coord in coordinates_list:
         lat, lng = coord['latitude'], coord['longitude']
         aim_id = coord['aim_id']
-        df = get_historical_temperature(lat, lng)
-        if df is not None:
-            avg_temp = df['temperature_mean'].mean()
-            temperature_data.append({
-                'lat': lat,
-                'lng': lng,
-                'avg_temp': avg_temp,
-                'aim_id': aim_id,
-                'address': coord['address']
-            })
-            detailed_data[aim_id] = df
-
-    if temperature_data:
+        if manifest is not None:
+            digest = hash_inputs(lat, lng, start_date, end_date, DAILY_VARIABLES, OPEN_METEO_GRID_DEG, output_format,
+                                 plots_config(config)[0])
+            if manifest.is_current(MANIFEST_STAGE, aim_id, digest):
+                print(f"Temperature data for {aim_id} is up to date, reusing saved data")
+                frames[aim_id] = load_saved_temperature(manifest.outputs(MANIFEST_STAGE, aim_id)[0], aim_id)
+            else:
+                digests[aim_id] = digest
+
+    # Aims in the same reanalysis grid cell get identical data, so each cell is fetched once.
+    pending = [coord for coord in coordinates_list if coord['aim_id'] not in frames]
+    fetched = fetch_per_cell(
+        [(coord['latitude'], coord['longitude']) for coord in pending],
+        lambda cell_lat, cell_lng: get_historical_temperature(cell_lat, cell_lng, start_date, end_date, store),
+        OPEN_METEO_GRID_DEG
+    )
+    for coord, df in zip(pending, fetched):
+        frames[coord['aim_id']] = df
+
+    detailed_data = {coord['aim_id']: frames[coord['aim_id']] for coord in coordinates_list
+                     if frames[coord['aim_id']] is not None}
+
+    if detailed_data:
+        changed_aims = set(digests) if manifest is not None else None
+        stats = compute_temperature_stats(detailed_data, seasonal_aggregations=STATISTICS_AGGREGATIONS)
+        temperature_data = temperature_summary(stats, locations)
         heatmap_file = create_heatmap(temperature_data, output_path)
-        create_trend_plots(detailed_data, output_path)
-        save_temperature_data(temperature_data, detailed_data, output_path)
+        preset, max_workers, _ = plots_config(config)
+        plot_paths = create_trend_plots(stats, output_path, aim_ids=changed_aims, preset=preset,
+                                        max_workers=max_workers)
+        csv_paths = save_temperature_data(temperature_data, stats, locations, output_path, aim_ids=changed_aims,
+                                          output_format=output_format)
+
+        if manifest is not None:
+            for aim_id, csv_path in csv_paths.items():
+                outputs = [csv_path] + ([plot_paths[aim_id]] if aim_id in plot_paths else [])
+                manifest.record(MANIFEST_STAGE, aim_id, digests[aim_id], outputs)
+            manifest.save()
+
+    if store is not None:
+        store.close()
+
+    return {'temperature_data': temperature_data, 'detailed_data': detailed_data}
 
 
 if __name__ == '__main__':
-    process_temperature_pipeline()
+    process_temperature_pipeline(manifest=Manifest())
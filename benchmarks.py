@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import tempfile
+
+
+def benchmark_detection_batch_sizes(image_dir, model_path, batch_sizes=(1, 2, 4, 8, 16), confidence_threshold=0.25, device=None):
+    """Times tree_detection over a folder of images for each batch size and prints images/sec."""
+    from model_registry import get_yolo_model
+    from tree_detection import run_tree_detection_batch, run_tree_detection_yolo_class
+
+    image_paths = [
+        os.path.join(image_dir, filename)
+        for filename in sorted(os.listdir(image_dir))
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    ]
+    if not image_paths:
+        print(f"No images found in '{image_dir}' for the benchmark.")
+        return {}
+
+    # Load the weights up front so the first batch size does not pay for it.
+    get_yolo_model(model_path, device)
+
+    results = {}
+    for batch_size in batch_sizes:
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            if batch_size == 1:
+                for image_path in image_paths:
+                    run_tree_detection_yolo_class(image_path, model_path, output_dir, confidence_threshold, device)
+            else:
+                run_tree_detection_batch(image_paths, model_path, output_dir, confidence_threshold, device, batch_size)
+            elapsed = time.perf_counter() - start
+        results[batch_size] = len(image_paths) / elapsed
+
+    print(f"\nDetection throughput over {len(image_paths)} images:")
+    for batch_size, images_per_sec in results.items():
+        print(f"  batch_size={batch_size:>3}: {images_per_sec:.2f} images/sec")
+    return results
+
+
+def benchmark_vegetation_batch_sizes(image_dir, model_path, batch_sizes=(1, 2, 4, 8, 16, 32), intra_op_threads=None):
+    """Times vegetation inference over a folder of images for each batch size and prints images/sec."""
+    from PIL import Image
+    from segment_the_vegetation import VegetationSegmenter, preprocess_batch
+
+    images = [
+        Image.open(os.path.join(image_dir, filename)).convert("RGB")
+        for filename in sorted(os.listdir(image_dir))
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    ]
+    if not images:
+        print(f"No images found in '{image_dir}' for the benchmark.")
+        return {}
+
+    segmenter = VegetationSegmenter(model_path, intra_op_threads=intra_op_threads)
+    inputs = preprocess_batch(images)
+    # One warm-up run so session initialisation is not timed.
+    segmenter.run(inputs[:1])
+
+    results = {}
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        for offset in range(0, len(inputs), batch_size):
+            segmenter.run(inputs[offset:offset + batch_size])
+        results[batch_size] = len(inputs) / (time.perf_counter() - start)
+
+    print(f"\nVegetation segmentation throughput over {len(images)} images:")
+    if segmenter.max_batch:
+        print(f"  (model has a fixed batch size of {segmenter.max_batch})")
+    for batch_size, images_per_sec in results.items():
+        print(f"  batch_size={batch_size:>3}: {images_per_sec:.2f} images/sec")
+    return results
+
+
+def benchmark_polygon_filter(num_nodes=100_000, seed=42):
+    """Compares the old per-node Point/contains loop with the vectorized polygon filter on a synthetic node table."""
+    import numpy as np
+    import pandas as pd
+    from shapely.geometry import Point
+    from spatial_filter import filter_nodes_within_polygons, polygon_from_latlon
+
+    rng = np.random.default_rng(seed)
+    nodes = pd.DataFrame(
+        {
+            'y': rng.uniform(54.90, 55.10, num_nodes),
+            'x': rng.uniform(-1.80, -1.50, num_nodes),
+        },
+        index=pd.RangeIndex(num_nodes, name='osmid'),
+    )
+    polygons = [
+        polygon_from_latlon([(55.05, -1.75), (55.00, -1.60), (54.95, -1.65), (54.98, -1.78)]),
+        polygon_from_latlon([(55.08, -1.58), (55.06, -1.52), (55.02, -1.55)]),
+    ]
+
+    start = time.perf_counter()
+    looped = []
+    for _, node in nodes.iterrows():
+        point = Point(node['x'], node['y'])
+        if any(polygon.contains(point) for polygon in polygons):
+            looped.append(node)
+    looped = pd.DataFrame(looped)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = filter_nodes_within_polygons(nodes, polygons)
+    vectorized_seconds = time.perf_counter() - start
+
+    assert looped.index.equals(vectorized.index), "vectorized filter disagrees with the per-node loop"
+    print(f"\nPolygon filter over {num_nodes} nodes ({len(vectorized)} inside):")
+    print(f"  iterrows + contains: {loop_seconds:.3f}s")
+    print(f"  vectorized:          {vectorized_seconds:.3f}s ({loop_seconds / vectorized_seconds:.0f}x faster)")
+    return {'loop': loop_seconds, 'vectorized': vectorized_seconds}
+
+
+def benchmark_mask_overlay(width=600, height=400, num_masks=40, seed=42):
+    """Compares per-pixel ImageDraw contour drawing with the array-based mask composite on synthetic tree masks."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+    from skimage.measure import find_contours
+    from mask_overlay import composite_masks, label_image
+
+    rng = np.random.default_rng(seed)
+    rows, cols = np.mgrid[0:height, 0:width]
+    centres = rng.uniform((0, 0), (height, width), (num_masks, 2))
+    radii = rng.uniform(10, 60, num_masks)
+    masks = (rows - centres[:, 0, None, None]) ** 2 + (cols - centres[:, 1, None, None]) ** 2 < radii[:, None, None] ** 2
+    image_np = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+    start = time.perf_counter()
+    image_pil = Image.fromarray(image_np)
+    draw = ImageDraw.Draw(image_pil, 'RGBA')
+    for mask in masks:
+        for contour in find_contours(mask, level=0.5, fully_connected='high'):
+            for point in contour:
+                x, y = tuple(np.flip(point, axis=0))
+                draw.point((x, y), fill=(0, 255, 0, 150))
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    Image.fromarray(composite_masks(image_np, label_image(masks)))
+    vectorized_seconds = time.perf_counter() - start
+
+    print(f"\nMask overlay of {num_masks} masks on a {width}x{height} image:")
+    print(f"  find_contours + ImageDraw.point: {loop_seconds:.3f}s")
+    print(f"  label image + composite:         {vectorized_seconds:.3f}s ({loop_seconds / vectorized_seconds:.0f}x faster)")
+    return {'loop': loop_seconds, 'vectorized': vectorized_seconds}
+
+
+def benchmark_sam_backends(image_dir, detection_dir, onnx_dir="models/sam_onnx", model_types=("vit_b", "vit_l"), max_images=10):
+    """Per-image SAM latency and mask IoU of the lighter / ONNX backends against PyTorch vit_h.
+
+    Boxes come from the detection YAML next to each image; backends whose weights are missing are skipped.
+    """
+    import numpy as np
+    import yaml
+    from PIL import Image
+    from manifest import hash_file
+    from sam_backends import DEFAULT_CHECKPOINTS, compare_segmenters, get_sam_segmenter, onnx_paths
+
+    samples = []
+    for filename in sorted(os.listdir(image_dir)):
+        stem, extension = os.path.splitext(filename)
+        yaml_path = os.path.join(detection_dir, stem + "_tree_detections.yaml")
+        if extension.lower() not in ('.png', '.jpg', '.jpeg') or not os.path.exists(yaml_path):
+            continue
+        with open(yaml_path, 'r') as yaml_file:
+            detections = yaml.safe_load(yaml_file) or []
+        image_path = os.path.join(image_dir, filename)
+        boxes = [[d['xh'], d['yh'], d['xw'], d['yw']] for d in detections]
+        samples.append((np.array(Image.open(image_path).convert("RGB")), hash_file(image_path), boxes))
+        if len(samples) == max_images:
+            break
+    if not samples:
+        print(f"No images with detections found in '{image_dir}' / '{detection_dir}' for the benchmark.")
+        return {}
+
+    reference = get_sam_segmenter("vit_h", DEFAULT_CHECKPOINTS["vit_h"])
+    candidates = {}
+    for model_type in model_types:
+        if os.path.exists(DEFAULT_CHECKPOINTS[model_type]):
+            candidates[f"torch {model_type}"] = get_sam_segmenter(model_type, DEFAULT_CHECKPOINTS[model_type])
+        for quantized in (False, True):
+            if all(os.path.exists(path) for path in onnx_paths(onnx_dir, model_type, quantized)):
+                name = f"onnx {model_type}" + (" int8" if quantized else "")
+                candidates[name] = get_sam_segmenter(model_type, backend="onnx", onnx_dir=onnx_dir, quantized=quantized)
+
+    results = compare_segmenters(samples, reference, candidates)
+    print(f"\nSAM backends over {len(samples)} images (IoU against torch vit_h):")
+    for name, result in results.items():
+        label = "torch vit_h" if name == 'reference' else name
+        print(f"  {label:<16}: {result['seconds_per_image']:.2f}s/image, mean IoU {result['mean_iou']:.3f}")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark = sys.argv[1] if len(sys.argv) > 1 else "detection"
+
+    if benchmark == "detection":
+        benchmark_detection_batch_sizes(
+            image_dir="data/coordinate_54.975056,-1.591944_images",
+            model_path="models/tree_detection_street_best.pt",
+        )
+    elif benchmark == "vegetation":
+        benchmark_vegetation_batch_sizes(
+            image_dir="data/coordinate_54.975056,-1.591944_images",
+            model_path="models/cityscapes_fan_tiny_hybrid_224.onnx",
+        )
+    elif benchmark == "polygon_filter":
+        benchmark_polygon_filter()
+    elif benchmark == "mask_overlay":
+        benchmark_mask_overlay()
+    elif benchmark == "sam_backends":
+        benchmark_sam_backends(
+            image_dir="data/coordinate_54.975056,-1.591944_images",
+            detection_dir="detected_trees_output_yolo_class",
+        )
+    else:
+        print(f"Unknown benchmark: {benchmark}")
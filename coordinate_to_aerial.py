@@ -3,8 +3,10 @@ import sys
 import time
 import requests
 import yaml  
+from image_cache import cache_from_config
+from location_store import load_coordinates
 
-def download_static_map_image(api_key, location, filename, zoom=18, maptype='satellite', size='600x300', markers_list=None, path=None):
+def download_static_map_image(api_key, location, filename, zoom=18, maptype='satellite', size='600x300', markers_list=None, path=None, cache=None):
     """Downloads a static map image with optional markers and path."""
     url = "https://maps.googleapis.com/maps/api/staticmap"
     params = {
@@ -21,7 +23,15 @@ def download_static_map_image(api_key, location, filename, zoom=18, maptype='sat
     if path:
         params['path'] = path
 
+    response = None
     try:
+        if cache is not None:
+            content = cache.fetch(url, params)
+            with open(filename, 'wb') as f:
+                f.write(content)
+            print(f"Static map image saved: {filename}")
+            return True
+
         response = requests.get(url, params=params, stream=True)
         response.raise_for_status()
 
@@ -33,13 +43,18 @@ def download_static_map_image(api_key, location, filename, zoom=18, maptype='sat
 
     except requests.exceptions.RequestException as e:
         print(f"Error downloading static map image: {e}")
-        print("Response Content:", response.text)
+        if response is not None:
+            print("Response Content:", response.text)
+        return False
+    except Exception as e:
+        print(f"Error reading static map image from cache: {e}")
         return False
 try:
     with open("config.yaml", 'r') as config_yaml_file:
         config = yaml.safe_load(config_yaml_file)
         api_key = config.get('api_key')
         output_dir = config.get('satellite_output_directory')
+        image_cache = cache_from_config(config)
 
         if not api_key or not output_dir:
             raise ValueError("API key or output_directory not found in config.yaml")
@@ -55,37 +70,37 @@ except ValueError as e:
     sys.exit(1)
 
 try:
-    with open("coordinates.yaml", 'r') as coordinates_yaml_file:
-        coordinates_config = yaml.safe_load(coordinates_yaml_file)
-
-        if not coordinates_config:
-            raise ValueError("No data found in coordinates.yaml")
-
-        for aim, details in coordinates_config.items():
-            latitude = details.get('latitude')
-            longitude = details.get('longitude')
-
-            if not latitude or not longitude:
-                print(f"Skipping {aim}: Latitude or longitude not found.")
-                continue
-
-            location = f"{latitude},{longitude}"
-            filename = os.path.join(output_dir, f"{aim.replace(' ', '_').replace(':', '')}.jpg")
-
-            print(f"Downloading satellite image for {aim}...")
-            success = download_static_map_image(
-                api_key=api_key,
-                location=location,
-                filename=filename,
-                zoom=19,
-                maptype="satellite",
-                size='600x600'
-            )
-
-            if success:
-                print(f"Image for {aim} saved as {filename}")
-            else:
-                print(f"Failed to download image for {aim}")
+    coordinates_config = load_coordinates("coordinates.yaml")
+
+    if not coordinates_config:
+        raise ValueError("No data found in coordinates.yaml")
+
+    for aim, details in coordinates_config.items():
+        latitude = details.get('latitude')
+        longitude = details.get('longitude')
+
+        if not latitude or not longitude:
+            print(f"Skipping {aim}: Latitude or longitude not found.")
+            continue
+
+        location = f"{latitude},{longitude}"
+        filename = os.path.join(output_dir, f"{aim.replace(' ', '_').replace(':', '')}.jpg")
+
+        print(f"Downloading satellite image for {aim}...")
+        success = download_static_map_image(
+            api_key=api_key,
+            location=location,
+            filename=filename,
+            zoom=19,
+            maptype="satellite",
+            size='600x600',
+            cache=image_cache
+        )
+
+        if success:
+            print(f"Image for {aim} saved as {filename}")
+        else:
+            print(f"Failed to download image for {aim}")
 
 except FileNotFoundError:
     print("Error: coordinates.yaml file not found. Make sure it exists in the same directory as the script.")
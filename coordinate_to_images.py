@@ -1,8 +1,10 @@
 import requests
 import os
 import yaml
-from PIL import Image
-import io
+from download_engine import DownloadEngine
+from image_cache import cache_from_config
+from jpeg_utils import parse_size, save_jpeg_bytes, save_jpeg_response
+from location_store import load_coordinates as load_locations
 
 CONFIG_FILE_PATH = "config.yaml"
 COORDINATES_FILE_PATH = "coordinates.yaml"
@@ -10,42 +12,57 @@ COORDINATES_FILE_PATH = "coordinates.yaml"
 FOV = 60
 PITCH = 0
 SIZE = "600x400"
+HEADINGS = 6
+
+STREET_VIEW_URL = "https://maps.googleapis.com/maps/api/streetview"
+MAX_WORKERS = 8
+REQUESTS_PER_SECOND = 10
 
 
 def load_config():
     """Load API key from config.yaml"""
+    return load_full_config().get("api_key")
+
+
+def load_full_config():
+    """Load every setting from config.yaml"""
     try:
         with open(CONFIG_FILE_PATH, 'r') as file:
-            config = yaml.safe_load(file)
-            return config.get("api_key")
+            return yaml.safe_load(file) or {}
     except Exception as e:
         print(f"Error loading config: {e}")
-        return None
+        return {}
 
 
 def load_coordinates():
-    """Load all Aim entries from coordinates.yaml"""
+    """Load all Aim entries from the location store, or coordinates.yaml if none is configured"""
     try:
-        with open(COORDINATES_FILE_PATH, 'r') as file:
-            return yaml.safe_load(file)
+        return load_locations(COORDINATES_FILE_PATH, CONFIG_FILE_PATH)
     except Exception as e:
         print(f"Error loading coordinates: {e}")
         return {}
 
 
-def get_street_view_image(location_str, heading, api_key, output_dir, filename):
+def get_street_view_image(location_str, heading, api_key, output_dir, filename, session=None, base_url=STREET_VIEW_URL, cache=None):
     """Download a single Street View image"""
-    url = (
-        f"https://maps.googleapis.com/maps/api/streetview?size={SIZE}"
-        f"&location={location_str}&fov={FOV}&heading={heading}&pitch={PITCH}&key={api_key}"
-    )
-
+    params = {
+        "size": SIZE,
+        "location": location_str,
+        "fov": FOV,
+        "heading": heading,
+        "pitch": PITCH,
+        "key": api_key,
+    }
+
+    image_path = os.path.join(output_dir, filename)
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        image = Image.open(io.BytesIO(response.content))
-        image_path = os.path.join(output_dir, filename)
-        image.save(image_path)
+        if cache is not None:
+            content = cache.fetch(base_url, params, session=session)
+            save_jpeg_bytes(content, image_path, expected_size=parse_size(SIZE))
+        else:
+            response = (session or requests).get(base_url, params=params, stream=True)
+            response.raise_for_status()
+            save_jpeg_response(response, image_path, expected_size=parse_size(SIZE))
         print(f"Saved: {image_path}")
         return image_path
     except Exception as e:
@@ -53,29 +70,38 @@ def get_street_view_image(location_str, heading, api_key, output_dir, filename):
         return None
 
 
-def download_street_view_set(aim_title, lat, lng, api_key):
-    """Download 6 Street View images for a given location"""
-    output_dir = os.path.join("data", aim_title.replace(":", "").replace(",", "").replace(" ", "_"))
+def aim_output_dir(aim_title):
+    """Directory that holds the Street View images of an aim"""
+    return os.path.join("data", aim_title.replace(":", "").replace(",", "").replace(" ", "_"))
+
+
+def street_view_jobs(aim_title, lat, lng, api_key):
+    """Build the get_street_view_image arguments for the 6 headings of a location"""
+    output_dir = aim_output_dir(aim_title)
     os.makedirs(output_dir, exist_ok=True)
 
     location = f"{lat},{lng}"
-    for i in range(6):
-        heading = i * FOV
-        filename = f"street_view_{i}.jpg"
-        get_street_view_image(location, heading, api_key, output_dir, filename)
+    return [
+        (location, i * FOV, api_key, output_dir, f"street_view_{i}.jpg")
+        for i in range(HEADINGS)
+    ]
 
 
-def main():
-    api_key = load_config()
-    if not api_key:
-        print("API key not found. Exiting.")
-        return
+def download_street_view_set(aim_title, lat, lng, api_key, engine=None):
+    """Download 6 Street View images for a given location"""
+    jobs = street_view_jobs(aim_title, lat, lng, api_key)
+    if engine is None:
+        return [get_street_view_image(*job) for job in jobs]
+    return engine.run(get_street_view_image, jobs)
 
-    coordinates_data = load_coordinates()
-    if not coordinates_data:
-        print("No coordinate data found. Exiting.")
-        return
 
+def download_all_street_views(coordinates_data, api_key, max_workers=MAX_WORKERS, requests_per_second=REQUESTS_PER_SECOND, base_url=STREET_VIEW_URL, cache=None):
+    """Download every heading of every aim concurrently through one pooled, rate-limited engine.
+
+    Returns {aim_title: [image paths]} with None in place of any heading that failed.
+    """
+    jobs = []
+    job_aims = []
     for aim_title, aim_data in coordinates_data.items():
         lat = aim_data.get('latitude')
         lng = aim_data.get('longitude')
@@ -91,8 +117,52 @@ def main():
             print(f"Skipping {aim_title}: invalid lat/lng format")
             continue
 
-        print(f"Downloading images for: {aim_title}")
-        download_street_view_set(aim_title, lat, lng, api_key)
+        print(f"Queueing images for: {aim_title}")
+        aim_jobs = street_view_jobs(aim_title, lat, lng, api_key)
+        jobs.extend(aim_jobs)
+        job_aims.extend([aim_title] * len(aim_jobs))
+
+    def fetch(*job, session):
+        return get_street_view_image(*job, session=session, base_url=base_url, cache=cache)
+
+    with DownloadEngine(max_workers=max_workers, requests_per_second=requests_per_second) as engine:
+        image_paths = engine.run(fetch, jobs)
+
+    downloaded = sum(1 for path in image_paths if path)
+    print(f"Downloaded {downloaded}/{len(jobs)} Street View images")
+
+    images_by_aim = {}
+    for aim_title, image_path in zip(job_aims, image_paths):
+        images_by_aim.setdefault(aim_title, []).append(image_path)
+    return images_by_aim
+
+
+def find_downloaded_images(coordinates_data):
+    """Rebuild {aim_title: [image paths]} from what a previous run left on disk"""
+    images_by_aim = {}
+    for aim_title in coordinates_data:
+        output_dir = aim_output_dir(aim_title)
+        images_by_aim[aim_title] = [
+            os.path.join(output_dir, f"street_view_{i}.jpg")
+            for i in range(HEADINGS)
+            if os.path.exists(os.path.join(output_dir, f"street_view_{i}.jpg"))
+        ]
+    return images_by_aim
+
+
+def main():
+    config = load_full_config()
+    api_key = config.get("api_key")
+    if not api_key:
+        print("API key not found. Exiting.")
+        return
+
+    coordinates_data = load_coordinates()
+    if not coordinates_data:
+        print("No coordinate data found. Exiting.")
+        return
+
+    download_all_street_views(coordinates_data, api_key, cache=cache_from_config(config))
 
 
 if __name__ == "__main__":
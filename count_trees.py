@@ -1,61 +1,108 @@
-from ultralytics import YOLO
+from model_registry import get_yolo_model
 import os
 from PIL import Image, ImageDraw
 import numpy as np
 
-def run_tree_detection_yolo_class(image_path, model_path, output_dir, confidence_threshold=0.20):
+def _save_tree_detections(image_path, results, names, output_dir, detected_image=None):
+    """Draws the tree boxes of one YOLO result onto the image and saves it."""
+    if results:
+        boxes = results.boxes
+        if detected_image is None:
+            detected_image = Image.open(image_path).convert("RGB")
+        draw = ImageDraw.Draw(detected_image)
+
+        tree_detected_count = 0
+
+        if boxes:
+            xyxy = boxes.xyxy.tolist()
+            confidences = boxes.conf.tolist()
+            class_ids = boxes.cls.int().tolist()
+
+            for i in range(len(xyxy)):
+                x1, y1, x2, y2 = map(int, xyxy[i])
+                confidence = confidences[i]
+                class_id = class_ids[i]
+                class_name = names[class_id]
+
+                if class_name == 'tree':
+                    tree_detected_count += 1
+                    label = f"{class_name}_{confidence:.2f}"
+                    draw.rectangle([(x1, y1), (x2, y2)], outline="green", width=2)
+                    text_position = (x1, y2 + 15)
+                    draw.text(text_position, label, fill="blue")
+
+        if tree_detected_count > 0:
+            print(f"Detected {tree_detected_count} trees in {image_path}")
+        else:
+            print(f"No trees detected in {image_path}")
+
+        output_path = os.path.join(output_dir, os.path.basename(image_path))
+        os.makedirs(output_dir, exist_ok=True)
+        detected_image.save(output_path)
+        print(f"Image with tree detections saved to: {output_path}")
+
+
+def run_tree_detection_yolo_class(image_path, model_path, output_dir, confidence_threshold=0.20, device=None):
     """Detects trees in an image using the YOLO class and saves the output."""
     try:
-        model = YOLO(model_path)
+        model = get_yolo_model(model_path, device)
         results = model.predict(
             source=image_path,
             conf=confidence_threshold,
             save=False,
             save_txt=False,
             save_conf=True,
+            device=device,
         )[0]
 
-        if results:
-            boxes = results.boxes
-            names = model.names
-            detected_image = Image.open(image_path).convert("RGB")
-            draw = ImageDraw.Draw(detected_image)
-
-            tree_detected_count = 0
-
-            if boxes:
-                xyxy = boxes.xyxy.tolist()
-                confidences = boxes.conf.tolist()
-                class_ids = boxes.cls.int().tolist()
-
-                for i in range(len(xyxy)):
-                    x1, y1, x2, y2 = map(int, xyxy[i])
-                    confidence = confidences[i]
-                    class_id = class_ids[i]
-                    class_name = names[class_id]
-
-                    if class_name == 'tree':
-                        tree_detected_count += 1
-                        label = f"{class_name}_{confidence:.2f}"
-                        draw.rectangle([(x1, y1), (x2, y2)], outline="green", width=2)
-                        text_position = (x1, y2 + 15)
-                        draw.text(text_position, label, fill="blue")
-
-            if tree_detected_count > 0:
-                print(f"Detected {tree_detected_count} trees in {image_path}")
-            else:
-                print(f"No trees detected in {image_path}")
-
-            output_path = os.path.join(output_dir, os.path.basename(image_path))
-            os.makedirs(output_dir, exist_ok=True)
-            detected_image.save(output_path)
-            print(f"Image with tree detections saved to: {output_path}")
+        _save_tree_detections(image_path, results, model.names, output_dir)
 
     except Exception as e:
         print(f"Error during tree detection: {e}")
 
 
-def process_directory(input_dir, model_path, output_dir, confidence_threshold=0.10):
+def run_tree_detection_batch(image_paths, model_path, output_dir, confidence_threshold=0.20, device=None, batch_size=8):
+    """Detects trees in a list of images with one YOLO predict call per batch and saves the outputs."""
+    try:
+        model = get_yolo_model(model_path, device)
+    except Exception as e:
+        print(f"Error loading YOLO model: {e}")
+        return
+
+    for start in range(0, len(image_paths), batch_size):
+        batch_paths = []
+        batch_images = []
+        for image_path in image_paths[start:start + batch_size]:
+            try:
+                batch_images.append(Image.open(image_path).convert("RGB"))
+                batch_paths.append(image_path)
+            except Exception as e:
+                print(f"Error loading image {image_path}: {e}")
+
+        if not batch_images:
+            continue
+
+        try:
+            batch_results = model.predict(
+                source=batch_images,
+                conf=confidence_threshold,
+                save=False,
+                save_txt=False,
+                save_conf=True,
+                device=device,
+            )
+        except Exception as e:
+            print(f"Error during batched tree detection: {e}")
+            continue
+
+        for image_path, image, results in zip(batch_paths, batch_images, batch_results):
+            try:
+                _save_tree_detections(image_path, results, model.names, output_dir, detected_image=image)
+            except Exception as e:
+                print(f"Error saving tree detections for {image_path}: {e}")
+
+
+def process_directory(input_dir, model_path, output_dir, confidence_threshold=0.10, device=None, batch_size=1):
     """Processes all images in the input directory for tree detection."""
     if not os.path.exists(input_dir):
         print(f"Input directory '{input_dir}' does not exist.")
@@ -63,11 +110,20 @@ def process_directory(input_dir, model_path, output_dir, confidence_threshold=0.
 
     os.makedirs(output_dir, exist_ok=True)
 
-    for filename in os.listdir(input_dir):
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            image_path = os.path.join(input_dir, filename)
-            print(f"Processing image: {image_path}")
-            run_tree_detection_yolo_class(image_path, model_path, output_dir, confidence_threshold)
+    image_paths = [
+        os.path.join(input_dir, filename)
+        for filename in os.listdir(input_dir)
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    ]
+
+    if batch_size > 1:
+        print(f"Processing {len(image_paths)} images in batches of {batch_size}")
+        run_tree_detection_batch(image_paths, model_path, output_dir, confidence_threshold, device, batch_size)
+        return
+
+    for image_path in image_paths:
+        print(f"Processing image: {image_path}")
+        run_tree_detection_yolo_class(image_path, model_path, output_dir, confidence_threshold, device)
 
 
 if __name__ == "__main__":
@@ -75,6 +131,7 @@ if __name__ == "__main__":
     input_directory = "data/Satellite_images"  # Directory containing satellite images
     output_directory = "count_trees_opt"  # Directory to save processed images
     confidence_threshold = 0.50  # Confidence threshold for tree detection
+    batch_size = 8  # Images per YOLO predict call
 
-    process_directory(input_directory, model_path, output_directory, confidence_threshold)
-    print("Tree detection for all images in the directory completed.")
\ No newline at end of file
+    process_directory(input_directory, model_path, output_directory, confidence_threshold, batch_size=batch_size)
+    print("Tree detection for all images in the directory completed.")
@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class RateLimiter:
+    """Spaces calls to wait() so that at most `requests_per_second` pass across all threads."""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def create_session(pool_size=8):
+    """Creates a requests session whose connection pool can keep `pool_size` connections alive per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class DownloadEngine:
+    """Runs download tasks on a bounded thread pool sharing one pooled session and a global rate limit.
+
+    Tasks receive the engine as their `session` argument, so anything written against
+    `requests.get(url, params=..., stream=...)` can be driven through it unchanged.
+    """
+
+    def __init__(self, max_workers=8, requests_per_second=10, timeout=30, session=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = session or create_session(pool_size=max_workers)
+        self.rate_limiter = RateLimiter(requests_per_second)
+
+    def get(self, url, params=None, stream=False, **kwargs):
+        self.rate_limiter.wait()
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, params=params, stream=stream, **kwargs)
+
+    def run(self, task, jobs):
+        """Calls task(*job, session=self) for every job concurrently and returns the results in job order."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(task, *job, session=self) for job in jobs]
+            return [future.result() for future in futures]
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
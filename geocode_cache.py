@@ -0,0 +1,56 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join("data", "geocode_cache.sqlite")
+
+
+def normalize_address(address):
+    """Canonical form used as the cache key: lower case, single spaces, tidy commas."""
+    address = re.sub(r"\s*,\s*", ", ", address.strip().lower())
+    return re.sub(r"\s+", " ", address).strip(" ,")
+
+
+class GeocodeCache:
+    """Persistent normalized-address -> (status, lat, lng) cache backed by SQLite."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocodes ("
+            " address TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " latitude REAL,"
+            " longitude REAL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, address):
+        """Returns (status, lat, lng) for a cached address, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, latitude, longitude FROM geocodes WHERE address = ?",
+                (normalize_address(address),),
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def put(self, address, status, lat, lng):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocodes (address, status, latitude, longitude, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (normalize_address(address), status, lat, lng, time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
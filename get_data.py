@@ -1,71 +1,25 @@
-import osmnx as ox
 import folium
 from folium.plugins import HeatMap
-import requests
 import json
 import pandas as pd
-import time
-from shapely.geometry import Point
-from shapely.geometry.polygon import Polygon
-from datetime import datetime
+from osm_cache import load_graph_nodes
+from weather_fetcher import HistoricalTemperatureFetcher
+from spatial_filter import filter_nodes_within_polygons, polygon_from_latlon
 import os
 
-def get_historical_avg_temperature(latitude, longitude, year, api_key):
-    """
-    Retrieves the average historical temperature for the given year for given coordinates.
-    """
-    base_url = "http://api.worldweatheronline.com/premium/v1/past-weather.ashx"
-    today = datetime.now()
-    start_date = f"{year}-{today.month:02d}-{today.day:02d}"
-    end_date = start_date
-    params = {
-        "key": api_key,
-        "q": f"{latitude},{longitude}",
-        "format": "json",
-        "date": start_date,
-        "enddate": end_date,
-        "tp": 24
-    }
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        if data and 'weather' in data['data']:
-            daily_temps = [float(day['avgtempC']) for day in data['data']['weather']]
-            if daily_temps:
-                return sum(daily_temps) / len(daily_temps)
-            else:
-                print(f"Warning: No historical temperature data for {latitude}, {longitude} in {year}.")
-                return None
-        else:
-            print(f"Warning: Could not retrieve historical temperature data for {latitude}, {longitude}.")
-            return None
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching historical temperature for {latitude}, {longitude}: {e}")
-        return None
-    except (KeyError, ValueError) as e:
-        print(f"Error parsing historical temperature response for {latitude}, {longitude}: {e}")
-        return None
-
-def create_heatmap(place, polygon_coords, api_keys, api_limit_per_key, output_dir="heatmaps"):
+def create_heatmap(place, polygon_coords, api_keys, api_limit_per_key, output_dir="heatmaps", requests_per_second=3.0,
+                   window_days=1):
     
     # Create the output directory if it doesn't exist
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    polygon = Polygon([(lon, lat) for lat, lon in polygon_coords])
-    G = ox.graph_from_place(place, network_type="drive")
-    nodes = ox.graph_to_gdfs(G, nodes=True, edges=False)
+    polygon = polygon_from_latlon(polygon_coords)
+    nodes = load_graph_nodes(place, network_type="drive")
     num_nodes = len(nodes)
     print(f"Total number of nodes: {num_nodes}")
 
-    nodes_within_polygon = []
-    for _, node in nodes.iterrows():
-        point = Point(node['x'], node['y'])
-        if polygon.contains(point):
-            nodes_within_polygon.append(node)
-
-    nodes_filtered = pd.DataFrame(nodes_within_polygon)
+    nodes_filtered = filter_nodes_within_polygons(nodes, [polygon])
     num_nodes_in_polygon = len(nodes_filtered)
     print(f"Number of nodes within the polygon: {num_nodes_in_polygon}")
 
@@ -81,30 +35,28 @@ def create_heatmap(place, polygon_coords, api_keys, api_limit_per_key, output_di
         print("No nodes found within the specified polygon. Skipping temperature data collection and heatmap generation.")
         return
 
+    # All years are fetched concurrently, each against its own key and rate limit.
+    print(f"\n--- Collecting data for years: {', '.join(str(year) for year in api_keys)} ---")
+    # Each node costs one request per month of its window, however many days the window spans.
+    fetcher = HistoricalTemperatureFetcher(api_keys, requests_per_second=requests_per_second, window_days=window_days)
+    try:
+        daily_temp_data = fetcher.fetch_daily(zip(sampled_nodes['y'], sampled_nodes['x']), limit_per_key=api_limit_per_key)
+    finally:
+        fetcher.close()
+    records_by_year = HistoricalTemperatureFetcher.summarize(daily_temp_data)
+
     all_temp_data = []
     for year, key in api_keys.items():
-        heat_data_historical = []
-        requests_made = 0
-        print(f"\n--- Collecting data for year: {year} ---")
+        print(f"\n--- Collected data for year: {year} ---")
+        year_records = records_by_year.get(year, [])
+        heat_data_historical = [[r['latitude'], r['longitude'], r['avg_temperature']] for r in year_records]
+        all_temp_data.extend(year_records)
 
         if not sampled_nodes.empty:
-            for index, node in sampled_nodes.iterrows():
-                if requests_made < api_limit_per_key:
-                    avg_temp = get_historical_avg_temperature(node['y'], node['x'], year, key)
-                    if avg_temp is not None:
-                        heat_data_historical.append([node['y'], node['x'], avg_temp])
-                        all_temp_data.append({
-                            'latitude': node['y'],
-                            'longitude': node['x'],
-                            'avg_temperature': avg_temp,
-                            'year': year,
-                            'api_key_used': key[-8:]
-                        })
-                    requests_made += 1
-                    time.sleep(0.3)  # Be kind to the API
-                else:
-                    print(f"API limit reached for year {year} (key ending in: {key[-8:]}). Stopping data collection for this year.")
-                    break
+            if window_days > 1:
+                daily_csv_filename = os.path.join(output_dir, f"newcastle_{year}_daily_temperature_within_polygon_sampled.csv")
+                daily_temp_data[daily_temp_data['year'] == year].to_csv(daily_csv_filename, index=False)
+                print(f"Daily temperature data for {year} saved as {daily_csv_filename}")
 
             csv_filename = os.path.join(output_dir, f"newcastle_{year}_avg_temperature_within_polygon_sampled.csv")
             df_historical = pd.DataFrame(all_temp_data)
@@ -163,5 +115,6 @@ if __name__ == "__main__":
     }
     api_limit_per_key =  1   #400 t0 500
     output_directory = "heatmaps"  #  You can change this if you want a different folder name
+    window_days = 1  # Days averaged per node and year, ending on today's date; one request covers up to a month
 
-    create_heatmap(place, polygon_coords, api_keys, api_limit_per_key, output_directory)
+    create_heatmap(place, polygon_coords, api_keys, api_limit_per_key, output_directory, window_days=window_days)
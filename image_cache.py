@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+DEFAULT_CACHE_DIR = os.path.join("data", "image_cache")
+DEFAULT_MAX_SIZE_MB = 2048
+DATA_SUFFIX = ".bin"
+# Entries written before the suffix was made format-neutral; renamed to DATA_SUFFIX on load.
+LEGACY_DATA_SUFFIX = ".jpg"
+# Temp files older than this are leftovers of a crashed writer; younger ones may still be in use.
+STALE_TMP_SECONDS = 3600
+
+# Request parameters that never change the returned image and must not end up on disk.
+IGNORED_PARAMS = {"key", "signature"}
+
+
+class CacheMiss(Exception):
+    """Raised in cache-only mode when a request is not already cached."""
+
+
+def normalize_params(url, params):
+    """Returns the canonical form of a request: the endpoint plus sorted parameters without the API key."""
+    normalized = {}
+    for name, value in (params or {}).items():
+        if name in IGNORED_PARAMS or value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = "|".join(str(v).strip() for v in value)
+        elif isinstance(value, float):
+            value = repr(value)
+        normalized[name] = str(value).strip()
+    return {"url": url.split("?")[0], "params": dict(sorted(normalized.items()))}
+
+
+def cache_key(url, params):
+    request = normalize_params(url, params)
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """On-disk cache of raw image responses keyed on the normalized request, with size-bounded LRU eviction.
+
+    Each entry is stored as <key>.bin (the response bytes exactly as received, JPEG or PNG) and
+    <key>.json (request parameters, content type, size and fetch time). File modification times
+    double as the LRU clock, so recency survives across runs.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB, offline=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _data_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}{DATA_SUFFIX}")
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index(self):
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+            if filename.endswith(".tmp"):
+                # Left behind by a process that died between writing and renaming an entry. Recent
+                # ones may belong to another process still writing, so only old ones are removed.
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            if filename.endswith(LEGACY_DATA_SUFFIX):
+                key = filename[:-len(LEGACY_DATA_SUFFIX)]
+                os.replace(path, self._data_path(key))
+                path = self._data_path(key)
+            elif filename.endswith(DATA_SUFFIX):
+                key = filename[:-len(DATA_SUFFIX)]
+            else:
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def get(self, url, params):
+        """Returns the cached bytes for a request, or None if it has not been cached."""
+        key = cache_key(url, params)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        data_path = self._data_path(key)
+        try:
+            with open(data_path, "rb") as f:
+                content = f.read()
+            os.utime(data_path)
+            return content
+        except FileNotFoundError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+
+    def put(self, url, params, content, content_type="image/jpeg"):
+        key = cache_key(url, params)
+        metadata = dict(normalize_params(url, params))
+        metadata.update({
+            "content_type": content_type,
+            "size": len(content),
+            "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+
+        data_path = self._data_path(key)
+        tmp_path = f"{data_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, data_path)
+        with open(self._meta_path(key), "w") as f:
+            json.dump(metadata, f, indent=2)
+
+        with self._lock:
+            self._total_bytes += len(content) - self._entries.pop(key, 0)
+            self._entries[key] = len(content)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            for path in (self._data_path(key), self._meta_path(key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def fetch(self, url, params, session=None, timeout=30):
+        """Returns the response bytes for a request, going to the network only on a cache miss."""
+        content = self.get(url, params)
+        if content is not None:
+            return content
+        if self.offline:
+            raise CacheMiss(f"{normalize_params(url, params)} is not cached and the cache is in cache-only mode")
+
+        response = (session or requests).get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        content = response.content
+        self.put(url, params, content, response.headers.get("Content-Type", "image/jpeg"))
+        return content
+
+
+def cache_from_config(config):
+    """Builds an ImageCache from the optional `image_cache` section of config.yaml, or None if it is disabled."""
+    settings = (config or {}).get("image_cache") or {}
+    if not settings.get("enabled", False):
+        return None
+    return ImageCache(
+        cache_dir=settings.get("directory", DEFAULT_CACHE_DIR),
+        max_size_mb=settings.get("max_size_mb", DEFAULT_MAX_SIZE_MB),
+        offline=settings.get("cache_only", False),
+    )
@@ -0,0 +1,96 @@
+import os
+import struct
+
+JPEG_SOI = b"\xff\xd8"
+# SOFn markers carry the frame dimensions; C4 (DHT), C8 (JPG) and CC (DAC) share the range but do not.
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+MAX_HEADER_BYTES = 256 * 1024
+
+
+class IncompleteHeader(ValueError):
+    """Raised when the bytes seen so far end before the JPEG frame header."""
+
+
+def jpeg_dimensions(data):
+    """Returns (width, height) from a JPEG's frame header without decoding any image data."""
+    if not data.startswith(JPEG_SOI):
+        raise ValueError("not a JPEG (missing SOI marker)")
+
+    pos = 2
+    while True:
+        if pos + 4 > len(data):
+            raise IncompleteHeader("JPEG header ends before the frame marker")
+        if data[pos] != 0xFF:
+            raise ValueError(f"corrupt JPEG header at byte {pos}")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            raise ValueError("JPEG has no frame header before the image data")
+
+        segment_length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if marker in SOF_MARKERS:
+            if pos + 9 > len(data):
+                raise IncompleteHeader("JPEG header ends inside the frame marker")
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + segment_length
+
+
+def parse_size(size):
+    """Turns a Maps API size string such as '600x400' into (width, height)."""
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+
+def _check_dimensions(dimensions, expected_size):
+    if expected_size and dimensions != expected_size:
+        raise ValueError(f"unexpected JPEG size {dimensions[0]}x{dimensions[1]}, expected {expected_size[0]}x{expected_size[1]}")
+
+
+def save_jpeg_bytes(content, path, expected_size=None):
+    """Writes JPEG bytes to disk unchanged after checking the header (and optionally the dimensions)."""
+    _check_dimensions(jpeg_dimensions(content), expected_size)
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def save_jpeg_response(response, path, expected_size=None, chunk_size=8192):
+    """Streams a JPEG HTTP response to disk in chunks, validating the header from the first bytes received.
+
+    The bytes are written exactly as served, so there is no decode/re-encode round trip.
+    The file only appears at `path` once the whole body has been written and checked.
+    """
+    tmp_path = f"{path}.part"
+    header = b""
+    validated = False
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                if not validated:
+                    header += chunk
+                    try:
+                        _check_dimensions(jpeg_dimensions(header), expected_size)
+                        validated = True
+                    except IncompleteHeader:
+                        if len(header) > MAX_HEADER_BYTES:
+                            raise ValueError("JPEG frame header not found")
+                f.write(chunk)
+        if not validated:
+            _check_dimensions(jpeg_dimensions(header), expected_size)
+        os.replace(tmp_path, path)
+        return path
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
@@ -0,0 +1,219 @@
+import os
+import sqlite3
+import sys
+import threading
+
+import yaml
+
+from geocode_cache import normalize_address
+
+CONFIG_FILE_PATH = "config.yaml"
+COORDINATES_FILE_PATH = "coordinates.yaml"
+
+
+class LocationStore:
+    """SQLite-backed store of aim locations.
+
+    Lookups by aim id use the primary key, appends are single-row inserts, and bounding-box
+    queries go through an R-tree index (or a plain latitude/longitude index when the SQLite
+    build lacks the R-tree module). coordinates.yaml can be imported and exported unchanged.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS locations ("
+            " id INTEGER PRIMARY KEY,"
+            " aim_id TEXT NOT NULL UNIQUE,"
+            " address TEXT,"
+            " address_key TEXT,"
+            " latitude REAL,"
+            " longitude REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS locations_address_key ON locations (address_key)")
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS locations_rtree"
+                " USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+            )
+            self.has_rtree = True
+        except sqlite3.OperationalError:
+            self._conn.execute("CREATE INDEX IF NOT EXISTS locations_lat_lng ON locations (latitude, longitude)")
+            self.has_rtree = False
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM locations").fetchone()[0]
+
+    def __contains__(self, aim_id):
+        return self.get(aim_id) is not None
+
+    @staticmethod
+    def _entry(address, latitude, longitude):
+        return {'address': address, 'latitude': latitude, 'longitude': longitude}
+
+    def get(self, aim_id):
+        """Returns {'address', 'latitude', 'longitude'} for an aim, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT address, latitude, longitude FROM locations WHERE aim_id = ?", (aim_id,)
+            ).fetchone()
+        return self._entry(*row) if row else None
+
+    def _insert(self, aim_id, address, latitude, longitude):
+        self._conn.execute(
+            "INSERT INTO locations (aim_id, address, address_key, latitude, longitude) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(aim_id) DO UPDATE SET address = excluded.address, address_key = excluded.address_key,"
+            " latitude = excluded.latitude, longitude = excluded.longitude",
+            (aim_id, address, normalize_address(str(address or "")), latitude, longitude),
+        )
+        row_id = self._conn.execute("SELECT id FROM locations WHERE aim_id = ?", (aim_id,)).fetchone()[0]
+        if self.has_rtree:
+            self._conn.execute("DELETE FROM locations_rtree WHERE id = ?", (row_id,))
+            if latitude is not None and longitude is not None:
+                self._conn.execute(
+                    "INSERT INTO locations_rtree (id, min_lat, max_lat, min_lng, max_lng) VALUES (?, ?, ?, ?, ?)",
+                    (row_id, latitude, latitude, longitude, longitude),
+                )
+
+    def add(self, aim_id, address, latitude, longitude):
+        """Inserts (or updates) one location without touching the rest of the store."""
+        self.add_many([(aim_id, address, latitude, longitude)])
+
+    def add_many(self, rows):
+        """Inserts (aim_id, address, latitude, longitude) rows in one transaction."""
+        with self._lock:
+            with self._conn:
+                for aim_id, address, latitude, longitude in rows:
+                    self._insert(aim_id, address, self._to_float(latitude), self._to_float(longitude))
+
+    @staticmethod
+    def _to_float(value):
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def all(self):
+        """Returns every location as the same {aim_id: {...}} mapping coordinates.yaml holds, in insertion order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT aim_id, address, latitude, longitude FROM locations ORDER BY id"
+            ).fetchall()
+        return {aim_id: self._entry(address, lat, lng) for aim_id, address, lat, lng in rows}
+
+    def query_bbox(self, min_lat, min_lng, max_lat, max_lng):
+        """Returns the {aim_id: {...}} locations inside a latitude/longitude bounding box, edges included."""
+        exact = "l.latitude BETWEEN ? AND ? AND l.longitude BETWEEN ? AND ?"
+        bounds = (min_lat, max_lat, min_lng, max_lng)
+        if self.has_rtree:
+            # R-tree boxes are float32, rounded outward: find candidates by overlap, then filter exactly.
+            sql = (
+                "SELECT l.aim_id, l.address, l.latitude, l.longitude FROM locations_rtree r"
+                " JOIN locations l ON l.id = r.id"
+                " WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lng >= ? AND r.min_lng <= ?"
+                f" AND {exact} ORDER BY l.id"
+            )
+            params = bounds + bounds
+        else:
+            sql = f"SELECT l.aim_id, l.address, l.latitude, l.longitude FROM locations l WHERE {exact} ORDER BY l.id"
+            params = bounds
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return {aim_id: self._entry(address, lat, lng) for aim_id, address, lat, lng in rows}
+
+    def count_aims(self):
+        """Number of 'Aim N ...' entries, used to number new aims."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM locations WHERE aim_id LIKE 'aim %'").fetchone()[0]
+
+    def address_keys(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT address_key FROM locations")}
+
+    def import_yaml(self, yaml_path=COORDINATES_FILE_PATH):
+        with open(yaml_path, 'r') as file:
+            coordinates_data = yaml.safe_load(file) or {}
+        self.add_many(
+            (aim_id, data.get('address'), data.get('latitude'), data.get('longitude'))
+            for aim_id, data in coordinates_data.items()
+        )
+        return len(coordinates_data)
+
+    def export_yaml(self, yaml_path=COORDINATES_FILE_PATH):
+        tmp_path = f"{yaml_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            yaml.dump(self.all(), file, sort_keys=False)
+        os.replace(tmp_path, yaml_path)
+        # Date the export like the store, so it is not mistaken for a hand edit made since.
+        store_mtime = os.path.getmtime(self.path)
+        os.utime(yaml_path, (store_mtime, store_mtime))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_location_store(config_path=CONFIG_FILE_PATH, coordinates_path=COORDINATES_FILE_PATH):
+    """Opens the store named by `location_store` in config.yaml, or returns None if none is configured.
+
+    A new, empty store is seeded from coordinates.yaml so existing projects migrate transparently.
+    After that the YAML is import/export only: edits made to it later are not picked up until
+    `python location_store.py import` is run, and a notice is printed while it is newer than the store.
+    """
+    try:
+        with open(config_path, 'r') as config_file:
+            config = yaml.safe_load(config_file) or {}
+    except FileNotFoundError:
+        return None
+
+    store_path = config.get('location_store')
+    if not store_path:
+        return None
+
+    store = LocationStore(store_path)
+    if len(store) == 0 and os.path.exists(coordinates_path):
+        imported = store.import_yaml(coordinates_path)
+        print(f"Imported {imported} locations from '{coordinates_path}' into '{store_path}'")
+    elif os.path.exists(coordinates_path) and os.path.getmtime(coordinates_path) > os.path.getmtime(store_path):
+        print(f"Note: '{coordinates_path}' changed after '{store_path}' was last written and is not read;"
+              f" run 'python location_store.py import' to load its edits.")
+    return store
+
+
+def load_coordinates(coordinates_path=COORDINATES_FILE_PATH, config_path=CONFIG_FILE_PATH):
+    """Returns every location as {aim_id: {...}}, from the location store if configured, else from the YAML."""
+    store = get_location_store(config_path, coordinates_path)
+    if store is not None:
+        try:
+            return store.all()
+        finally:
+            store.close()
+
+    with open(coordinates_path, 'r') as file:
+        return yaml.safe_load(file) or {}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python location_store.py import|export [coordinates.yaml]")
+        sys.exit(1)
+
+    location_store = get_location_store()
+    if location_store is None:
+        print(f"No 'location_store' configured in '{CONFIG_FILE_PATH}'.")
+        sys.exit(1)
+
+    yaml_path = sys.argv[2] if len(sys.argv) > 2 else COORDINATES_FILE_PATH
+    if sys.argv[1] == "import":
+        print(f"Imported {location_store.import_yaml(yaml_path)} locations from '{yaml_path}'")
+    else:
+        location_store.export_yaml(yaml_path)
+        print(f"Exported {len(location_store)} locations to '{yaml_path}'")
+    location_store.close()
@@ -1,53 +1,190 @@
-import subprocess
+import argparse
 import os
-from tree_detection import run_tree_detection_yolo_class  # Import the tree detection function
+import yaml
+from pipeline import Pipeline
 
-def run_street_to_coordinate():
-    """Runs street_to_coordinate.py script to get coordinates and save to YAML."""
-    print("Running street_to_coordinate.py to get coordinates...")
+CONFIG_FILE_PATH = "config.yaml"
+COORDINATES_FILE_PATH = "coordinates.yaml"
+
+DETECTION_MODEL_PATH = "models/best.pt"  # Path to your YOLO model
+DETECTION_OUTPUT_DIR = "detected_trees_output_main_integrated"  # Output directory for tree detection results
+DETECTION_BATCH_SIZE = 6  # One Street View heading set per predict call
+
+SAM_CHECKPOINT = "models/sam_vit_h_4b8939.pth"
+SEGMENTATION_OUTPUT_DIR = "segmented_trees_output_sam"
+
+STAGES = ["geocode", "download", "detect", "segment", "temperature"]
+
+
+def load_config():
+    """Loads config.yaml, which every stage shares."""
     try:
-        subprocess.run(["python", "street_to_coordinate.py"], check=True) # Ensure script is in the same directory or adjust path
-        print("street_to_coordinate.py finished successfully.")
-    except subprocess.CalledProcessError as e:
-        print(f"Error running street_to_coordinate.py: {e}")
-        exit(1) # Exit main script if street_to_coordinate.py fails
-
-def run_coordinate_to_images():
-    """Runs coordinate_to_images.py script to generate panorama images."""
-    print("Running coordinate_to_images.py to generate panorama...")
+        with open(CONFIG_FILE_PATH, 'r') as config_file:
+            return yaml.safe_load(config_file) or {}
+    except FileNotFoundError:
+        print(f"Error: Configuration file '{CONFIG_FILE_PATH}' not found.")
+        return {}
+
+
+def aim_subdir(aim_title):
+    from coordinate_to_images import aim_output_dir
+    return os.path.basename(aim_output_dir(aim_title))
+
+
+def geocode_stage(api_key):
+    """Asks for a new location and appends it to coordinates.yaml."""
+    from location_store import get_location_store
+    from street_to_coordinate import geocode_interactive
+
+    store = get_location_store(CONFIG_FILE_PATH, COORDINATES_FILE_PATH)
     try:
-        subprocess.run(["python", "coordinate_to_images.py"], check=True) # Ensure script is in the same directory or adjust path
-        print("coordinate_to_images.py finished successfully.")
-    except subprocess.CalledProcessError as e:
-        print(f"Error running coordinate_to_images.py: {e}")
-        exit(1) # Exit main script if coordinate_to_images.py fails
+        coordinates = geocode_interactive(api_key, COORDINATES_FILE_PATH, store=store)
+    finally:
+        if store is not None:
+            store.close()
+    if coordinates is None:
+        raise RuntimeError("Geocoding did not produce any coordinates")
+    return {"coordinates": coordinates}
+
+
+def load_coordinates():
+    from location_store import load_coordinates as load_locations
+    return {"coordinates": load_locations(COORDINATES_FILE_PATH, CONFIG_FILE_PATH)}
+
+
+def download_stage(coordinates, api_key, image_cache):
+    """Downloads the Street View heading set of every aim."""
+    from coordinate_to_images import download_all_street_views
+    return {"images_by_aim": download_all_street_views(coordinates, api_key, cache=image_cache)}
+
+
+def load_downloaded_images():
+    from coordinate_to_images import find_downloaded_images
+    return {"images_by_aim": find_downloaded_images(load_coordinates()["coordinates"])}
 
-def run_tree_detection():
-    """Runs tree detection on the generated panorama images."""
-    print("Running tree detection on panorama images...")
-    model_path = "models/best.pt"  # Path to your YOLO model
-    image_dir = "data/coordinate_54.975056,-1.591944_images" # Assuming images are saved in the 'data' directory
-    output_directory = "detected_trees_output_main_integrated" # Output directory for tree detection results
 
-    os.makedirs(output_directory, exist_ok=True) # Create output directory if it doesn't exist
+def detect_stage(images_by_aim, manifest):
+    """Runs tree detection on the downloaded images of every aim."""
+    from tree_detection import run_tree_detection_batch
 
-    image_files = [f for f in os.listdir(image_dir) if f.endswith(('.jpg', '.jpeg', '.png'))] # Get image files from data dir
+    detection_dirs = {}
+    for aim_title, image_paths in images_by_aim.items():
+        image_paths = [path for path in image_paths if path]
+        if not image_paths:
+            print(f"No images found for '{aim_title}', skipping tree detection.")
+            continue
+        output_dir = os.path.join(DETECTION_OUTPUT_DIR, aim_subdir(aim_title))
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"Processing {len(image_paths)} images for: {aim_title}")
+        run_tree_detection_batch(image_paths, DETECTION_MODEL_PATH, output_dir, batch_size=DETECTION_BATCH_SIZE,
+                                 manifest=manifest)
+        detection_dirs[aim_title] = output_dir
+    return {"detection_dirs": detection_dirs}
 
-    if not image_files:
-        print(f"No images found in '{image_dir}' directory for tree detection.")
-        return
 
-    for image_file in image_files:
-        image_path = os.path.join(image_dir, image_file)
-        print(f"Processing image: {image_path}")
-        run_tree_detection_yolo_class(image_path, model_path, output_dir=output_directory) # Run tree detection
+def load_detection_dirs():
+    coordinates = load_coordinates()["coordinates"]
+    return {"detection_dirs": {
+        aim_title: os.path.join(DETECTION_OUTPUT_DIR, aim_subdir(aim_title))
+        for aim_title in coordinates
+        if os.path.isdir(os.path.join(DETECTION_OUTPUT_DIR, aim_subdir(aim_title)))
+    }}
 
-    print("Tree detection process finished.")
+
+def segment_stage(images_by_aim, detection_dirs, manifest):
+    """Segments every detected tree with SAM, using the detection YAML of each image.
+
+    The `sam` section of config.yaml picks the backend: a PyTorch checkpoint (vit_b / vit_l / vit_h)
+    or an ONNX export for CPU-only workers.
+    """
+    from sam_backends import onnx_paths, sam_settings, segmenter_from_settings
+
+    settings = sam_settings(load_config())
+    settings['checkpoint'] = settings['checkpoint'] or SAM_CHECKPOINT
+    if settings['backend'] == 'onnx':
+        required = onnx_paths(settings['onnx_dir'], settings['model_type'], settings['quantized'])
+    else:
+        required = (settings['checkpoint'],)
+    missing = [path for path in required if not os.path.exists(path)]
+    if missing:
+        print(f"SAM model not found at '{missing[0]}', skipping tree segmentation.")
+        return {"segmentation_dirs": {}}
+
+    from segment_the_trees import segment_trees_with_sam
+
+    segmenter = segmenter_from_settings(settings)
+
+    segmentation_dirs = {}
+    for aim_title, detection_dir in detection_dirs.items():
+        output_dir = os.path.join(SEGMENTATION_OUTPUT_DIR, aim_subdir(aim_title))
+        for image_path in images_by_aim.get(aim_title, []):
+            if not image_path:
+                continue
+            yaml_filename = os.path.splitext(os.path.basename(image_path))[0] + "_tree_detections.yaml"
+            yaml_path = os.path.join(detection_dir, yaml_filename)
+            if os.path.exists(yaml_path):
+                segment_trees_with_sam(image_path, yaml_path, sam_model_type=settings['model_type'],
+                                       sam_checkpoint=settings['checkpoint'], output_dir=output_dir,
+                                       manifest=manifest, segmenter=segmenter)
+        segmentation_dirs[aim_title] = output_dir
+    if manifest is not None:
+        manifest.save()
+    return {"segmentation_dirs": segmentation_dirs}
+
+
+def temperature_stage(coordinates, manifest):
+    """Fetches historical temperatures and writes the heatmap, plots and statistics."""
+    from Temp_comp import process_temperature_pipeline
+    return process_temperature_pipeline(CONFIG_FILE_PATH, COORDINATES_FILE_PATH, coordinates_data=coordinates,
+                                        manifest=manifest)
+
+
+def build_pipeline():
+    pipeline = Pipeline()
+    pipeline.add_stage("geocode", geocode_stage, inputs=["api_key"], outputs=["coordinates"], load=load_coordinates)
+    pipeline.add_stage("download", download_stage, inputs=["coordinates", "api_key", "image_cache"],
+                       outputs=["images_by_aim"], load=load_downloaded_images)
+    pipeline.add_stage("detect", detect_stage, inputs=["images_by_aim", "manifest"], outputs=["detection_dirs"],
+                       load=load_detection_dirs)
+    pipeline.add_stage("segment", segment_stage, inputs=["images_by_aim", "detection_dirs", "manifest"],
+                       outputs=["segmentation_dirs"])
+    pipeline.add_stage("temperature", temperature_stage, inputs=["coordinates", "manifest"],
+                       outputs=["temperature_data", "detailed_data"])
+    return pipeline
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the tree and temperature pipeline in-process.")
+    parser.add_argument("--from", dest="start_from", choices=STAGES,
+                        help="Resume from this stage, reloading earlier outputs from disk.")
+    parser.add_argument("--only", nargs="+", choices=STAGES, help="Run only these stages.")
+    parser.add_argument("--parallel", action="store_true", help="Run independent stages concurrently.")
+    parser.add_argument("--force", action="store_true",
+                        help="Recompute every stage even when its inputs are unchanged since the last run.")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
+    args = parse_args()
     print("Starting main script...")
-    run_street_to_coordinate() # Run street_to_coordinate.py
-    run_coordinate_to_images() # Run coordinate_to_images.py
-    run_tree_detection()      # Run tree detection after image generation
-    print("Main script finished.")
\ No newline at end of file
+
+    config = load_config()
+    api_key = config.get("api_key")
+    if not api_key:
+        print("Error: API key not found in configuration file.")
+        exit(1)
+
+    from image_cache import cache_from_config
+    from manifest import Manifest
+
+    context = {
+        "api_key": api_key,
+        "image_cache": cache_from_config(config),
+        "manifest": Manifest(force=args.force),
+    }
+    try:
+        build_pipeline().run(context, start_from=args.start_from, only=args.only, parallel=args.parallel)
+    except Exception as e:
+        print(f"Pipeline failed: {e}")
+        exit(1)
+    print("Main script finished.")
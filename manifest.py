@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import threading
+
+DEFAULT_MANIFEST_PATH = os.path.join("data", "manifest.json")
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    """Cheap identity for large, rarely-changing files such as model checkpoints: path, size and mtime."""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def hash_inputs(*parts):
+    """Combines strings, numbers, bytes and JSON-able values into one digest describing a stage's inputs."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            data = part
+        elif isinstance(part, str):
+            data = part.encode("utf-8")
+        else:
+            data = json.dumps(part, sort_keys=True, default=str).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Records, per stage and item, the digest of the inputs that produced a set of output files.
+
+    A stage asks `is_current` before doing any work and calls `record` once its outputs are written;
+    `save` persists the manifest atomically, so callers should call it at the end of a batch.
+    With `force`, nothing is ever reported as current, but new results are still recorded.
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH, force=False):
+        self.path = path
+        self.force = force
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: could not read manifest '{path}', starting a new one: {e}")
+
+    def get(self, stage, key):
+        with self._lock:
+            return self._entries.get(stage, {}).get(key)
+
+    def is_current(self, stage, key, digest):
+        """True if `key` was last produced from the same inputs and all of its outputs still exist."""
+        if self.force:
+            return False
+        entry = self.get(stage, key)
+        if not entry or entry.get("inputs") != digest:
+            return False
+        return all(os.path.exists(path) for path in entry.get("outputs", []))
+
+    def outputs(self, stage, key):
+        entry = self.get(stage, key)
+        return list(entry.get("outputs", [])) if entry else []
+
+    def record(self, stage, key, digest, outputs):
+        with self._lock:
+            self._entries.setdefault(stage, {})[key] = {"inputs": digest, "outputs": list(outputs)}
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
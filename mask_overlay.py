@@ -0,0 +1,47 @@
+import numpy as np
+
+MASK_COLOR = (0, 255, 0)
+FILL_ALPHA = 0.35
+OUTLINE_ALPHA = 150 / 255
+
+
+def label_image(masks):
+    """Packs an (N, H, W) stack of boolean masks into one uint16 label image.
+
+    Pixel value i + 1 marks mask i and 0 is background; where masks overlap the later one wins.
+    """
+    masks = np.asarray(masks, dtype=bool)
+    if masks.shape[0] > np.iinfo(np.uint16).max:
+        raise ValueError(f"Too many masks for a uint16 label image: {masks.shape[0]}")
+    if masks.shape[0] == 0:
+        return np.zeros(masks.shape[1:], dtype=np.uint16)
+    # argmax over the reversed stack finds the last mask covering each pixel.
+    last = masks.shape[0] - np.argmax(masks[::-1], axis=0)
+    return np.where(masks.any(axis=0), last, 0).astype(np.uint16)
+
+
+def label_outlines(labels):
+    """Boolean image of labelled pixels with a 4-neighbour of a different label (including background)."""
+    edges = np.zeros(labels.shape, dtype=bool)
+    edges[:-1, :] |= labels[:-1, :] != labels[1:, :]
+    edges[1:, :] |= labels[1:, :] != labels[:-1, :]
+    edges[:, :-1] |= labels[:, :-1] != labels[:, 1:]
+    edges[:, 1:] |= labels[:, 1:] != labels[:, :-1]
+    return edges & (labels > 0)
+
+
+def composite_masks(image_np, labels, color=MASK_COLOR, fill_alpha=FILL_ALPHA, outline_alpha=OUTLINE_ALPHA):
+    """Blends every labelled region of an RGB image with `color` in one array operation.
+
+    Regions are tinted with `fill_alpha` and their outlines drawn with `outline_alpha`; set either
+    to 0 to leave it out. Returns a new uint8 RGB array.
+    """
+    alpha = np.zeros(labels.shape, dtype=np.float32)
+    if fill_alpha:
+        alpha[labels > 0] = fill_alpha
+    if outline_alpha:
+        alpha[label_outlines(labels)] = outline_alpha
+    alpha = alpha[..., None]
+    blended = image_np.astype(np.float32) * (1 - alpha) + np.asarray(color, dtype=np.float32) * alpha
+    return np.rint(blended).astype(np.uint8)
+
@@ -0,0 +1,99 @@
+import struct
+import zipfile
+
+import numpy as np
+
+# Bits set in each byte value, for counting mask pixels without unpacking.
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+_LOCAL_HEADER_SIZE = 30
+
+
+def pixel_count(packed):
+    """Number of set pixels in np.packbits output, summed over the last axis."""
+    return POPCOUNT[packed].sum(axis=-1, dtype=np.int64)
+
+
+def write_masks(path, masks):
+    """Saves an (N, H, W) stack of boolean masks as bit-packed rows in an uncompressed npz.
+
+    `bits` holds one packed row per mask and `union` the packed union of all masks, so canopy
+    cover can be read without touching the per-mask rows.
+    """
+    masks = np.asarray(masks, dtype=bool)
+    count, height, width = masks.shape
+    np.savez(
+        path,
+        shape=np.array([height, width], dtype=np.int64),
+        bits=np.packbits(masks.reshape(count, height * width), axis=1),
+        union=np.packbits(masks.any(axis=0).reshape(-1)),
+    )
+    return path
+
+
+def _member_memmap(path, name):
+    """Memory-maps an array stored uncompressed inside an npz archive; None if it is compressed."""
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(f"{name}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(path, 'rb') as npz_file:
+        npz_file.seek(info.header_offset)
+        local_header = npz_file.read(_LOCAL_HEADER_SIZE)
+        name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+        npz_file.seek(info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length)
+        version = np.lib.format.read_magic(npz_file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(npz_file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(npz_file)
+        offset = npz_file.tell()
+    if 0 in shape:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape, offset=offset,
+                     order='F' if fortran_order else 'C')
+
+
+class PackedMasks:
+    """Read-only view of a mask file written by write_masks.
+
+    The packed rows are memory-mapped, so indexing one tree only reads and unpacks that tree.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with np.load(path) as archive:
+            self.shape = tuple(int(size) for size in archive['shape'])
+            fallback = {name: archive[name] for name in ('bits', 'union')}
+        self.bits = _member_memmap(path, 'bits')
+        self.union_bits = _member_memmap(path, 'union')
+        if self.bits is None or self.union_bits is None:
+            self.bits, self.union_bits = fallback['bits'], fallback['union']
+
+    def __len__(self):
+        return self.bits.shape[0]
+
+    def _unpack(self, packed):
+        height, width = self.shape
+        return np.unpackbits(packed, count=height * width).reshape(height, width).astype(bool)
+
+    def __getitem__(self, index):
+        """Boolean (H, W) mask of one tree."""
+        return self._unpack(self.bits[index])
+
+    def union(self):
+        return self._unpack(self.union_bits)
+
+    def areas(self):
+        """Pixel count of every mask, counted on the packed rows."""
+        return pixel_count(self.bits)
+
+    def canopy_statistics(self):
+        """Tree count, per-tree areas and canopy cover of the frame, without unpacking any mask."""
+        height, width = self.shape
+        canopy_pixels = int(pixel_count(self.union_bits))
+        return {
+            'trees': len(self),
+            'tree_areas': self.areas().tolist(),
+            'canopy_pixels': canopy_pixels,
+            'canopy_fraction': canopy_pixels / (height * width) if height * width else 0.0,
+        }
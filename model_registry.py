@@ -0,0 +1,70 @@
+import os
+import threading
+from collections import OrderedDict
+
+MAX_CACHED_MODELS = 4
+
+_models = OrderedDict()
+_lock = threading.Lock()
+
+
+def _registry_key(model_path, device):
+    return (os.path.abspath(model_path), device or "auto")
+
+
+def get_yolo_model(model_path, device=None):
+    """Returns a YOLO model for (model_path, device), loading it only on first use in this process."""
+    key = _registry_key(model_path, device)
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            return model
+
+        from ultralytics import YOLO
+
+        print(f"Loading YOLO model: {model_path} (device: {device or 'auto'})")
+        model = YOLO(model_path)
+        if device:
+            model.to(device)
+
+        _models[key] = model
+        while len(_models) > MAX_CACHED_MODELS:
+            evicted_key, _ = _models.popitem(last=False)
+            print(f"Evicted model from registry: {evicted_key}")
+        return model
+
+
+def get_sam_model(model_type, checkpoint, device=None):
+    """Returns a SAM model for (model_type, checkpoint, device), loading it only on first use in this process.
+
+    SAM models share the registry (and its LRU limit) with the YOLO models.
+    """
+    import torch
+
+    device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+    key = ("sam", model_type, os.path.abspath(checkpoint), device)
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            return model
+
+        from segment_anything import sam_model_registry
+
+        print(f"Loading SAM model: {model_type} from {checkpoint} (device: {device})")
+        model = sam_model_registry[model_type](checkpoint=checkpoint)
+        model.to(device)
+        model.eval()
+
+        _models[key] = model
+        while len(_models) > MAX_CACHED_MODELS:
+            evicted_key, _ = _models.popitem(last=False)
+            print(f"Evicted model from registry: {evicted_key}")
+        return model
+
+
+def clear_models():
+    """Drops every cached model, e.g. to free GPU memory between pipeline runs."""
+    with _lock:
+        _models.clear()
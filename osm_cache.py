@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join("data", "osm_cache")
+# Only the columns the heatmap scripts read; the geometry is rebuilt from x/y if ever needed.
+NODE_COLUMNS = ['y', 'x', 'street_count']
+
+
+def graph_cache_key(place, network_type="drive", polygon=None):
+    request = {
+        "place": place.strip().lower() if place else None,
+        "network_type": network_type,
+        "polygon": polygon.wkt if polygon is not None else None,
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class CachedGraph:
+    """OSM street network for a place, cached on disk and loaded lazily.
+
+    `nodes` reads only the compact node table (Parquet, or gzipped CSV without pyarrow).
+    `graph` loads the full GraphML network, fetching and caching it on first use.
+    """
+
+    def __init__(self, place, network_type="drive", polygon=None, cache_dir=DEFAULT_CACHE_DIR):
+        self.place = place
+        self.network_type = network_type
+        self.polygon = polygon
+        self.cache_dir = cache_dir
+        key = graph_cache_key(place, network_type, polygon)
+        if _parquet_available():
+            self.nodes_path = os.path.join(cache_dir, f"{key}_nodes.parquet")
+        else:
+            self.nodes_path = os.path.join(cache_dir, f"{key}_nodes.csv.gz")
+        self.graph_path = os.path.join(cache_dir, f"{key}.graphml")
+        self._nodes = None
+        self._graph = None
+
+    def _fetch_graph(self):
+        import osmnx as ox
+
+        print(f"Downloading OSM {self.network_type} network for: {self.place or 'polygon'}")
+        if self.polygon is not None:
+            return ox.graph_from_polygon(self.polygon, network_type=self.network_type)
+        return ox.graph_from_place(self.place, network_type=self.network_type)
+
+    def _save_nodes(self, graph):
+        import osmnx as ox
+
+        nodes = ox.graph_to_gdfs(graph, nodes=True, edges=False)
+        columns = [column for column in NODE_COLUMNS if column in nodes.columns]
+        node_table = pd.DataFrame(nodes[columns])
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.nodes_path}.tmp"
+        if self.nodes_path.endswith(".parquet"):
+            node_table.to_parquet(tmp_path)
+        else:
+            node_table.to_csv(tmp_path, compression="gzip")
+        os.replace(tmp_path, self.nodes_path)
+        print(f"Cached {len(node_table)} OSM nodes to: {self.nodes_path}")
+        return node_table
+
+    def _read_nodes(self):
+        if self.nodes_path.endswith(".parquet"):
+            return pd.read_parquet(self.nodes_path)
+        return pd.read_csv(self.nodes_path, index_col=0, compression="gzip")
+
+    def _load_graph(self, save_graphml):
+        if self._graph is None:
+            import osmnx as ox
+
+            if os.path.exists(self.graph_path):
+                self._graph = ox.load_graphml(self.graph_path)
+            else:
+                self._graph = self._fetch_graph()
+        if save_graphml and not os.path.exists(self.graph_path):
+            import osmnx as ox
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            ox.save_graphml(self._graph, self.graph_path)
+        return self._graph
+
+    @property
+    def nodes(self):
+        """Node table indexed by OSM id with x (lon) and y (lat) columns."""
+        if self._nodes is None:
+            if os.path.exists(self.nodes_path):
+                self._nodes = self._read_nodes()
+                print(f"Loaded {len(self._nodes)} OSM nodes from cache: {self.nodes_path}")
+            else:
+                # Only the node table is persisted here; GraphML is written when edges are asked for.
+                self._nodes = self._save_nodes(self._load_graph(save_graphml=False))
+        return self._nodes
+
+    @property
+    def graph(self):
+        """Full networkx graph, including edges."""
+        graph = self._load_graph(save_graphml=True)
+        if self._nodes is None and not os.path.exists(self.nodes_path):
+            self._nodes = self._save_nodes(graph)
+        return graph
+
+
+def load_graph_nodes(place, network_type="drive", polygon=None, cache_dir=DEFAULT_CACHE_DIR):
+    """Node table of the OSM network for a place, downloading the network only if it is not cached yet."""
+    return CachedGraph(place, network_type, polygon, cache_dir).nodes
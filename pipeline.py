@@ -0,0 +1,140 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Stage:
+    """A named pipeline step that reads `inputs` from the shared context and returns a dict of `outputs`.
+
+    `load` is an optional callable that rebuilds the stage's outputs from what an earlier run left on
+    disk; it is used instead of `func` when the pipeline is resumed from a later stage.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), load=None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.load = load
+
+
+class Pipeline:
+    """Runs stages in dependency order inside one process, passing data between them in memory."""
+
+    def __init__(self):
+        self.stages = {}
+        self.timings = {}
+        self.wall_time = 0.0
+
+    def add_stage(self, name, func, inputs=(), outputs=(), load=None):
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already defined")
+        self.stages[name] = Stage(name, func, inputs, outputs, load)
+        return self
+
+    def _producers(self):
+        producers = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                producers[output] = stage.name
+        return producers
+
+    def dependencies(self, name):
+        producers = self._producers()
+        return {producers[i] for i in self.stages[name].inputs if i in producers and producers[i] != name}
+
+    def order(self):
+        """Returns the stage names topologically sorted, keeping declaration order among independent stages."""
+        ordered = []
+        remaining = list(self.stages)
+        while remaining:
+            ready = [name for name in remaining if self.dependencies(name) <= set(ordered)]
+            if not ready:
+                raise ValueError(f"Pipeline has a dependency cycle among: {', '.join(remaining)}")
+            ordered.extend(ready)
+            remaining = [name for name in remaining if name not in ready]
+        return ordered
+
+    def _upstream(self, name):
+        seen = set()
+        pending = [name]
+        while pending:
+            for dependency in self.dependencies(pending.pop()):
+                if dependency not in seen:
+                    seen.add(dependency)
+                    pending.append(dependency)
+        return seen
+
+    def _run_stage(self, stage, context):
+        missing = [i for i in stage.inputs if i not in context]
+        if missing:
+            raise KeyError(f"Stage '{stage.name}' is missing inputs: {', '.join(missing)}")
+
+        print(f"\n=== Stage: {stage.name} ===")
+        start = time.perf_counter()
+        outputs = stage.func(**{i: context[i] for i in stage.inputs}) or {}
+        self.timings[stage.name] = time.perf_counter() - start
+        print(f"Stage '{stage.name}' finished in {self.timings[stage.name]:.2f}s")
+        return outputs
+
+    def run(self, context=None, start_from=None, only=None, parallel=False, max_workers=4):
+        """Runs the pipeline and returns the final context.
+
+        start_from: skip every stage upstream of this one, rebuilding their outputs with their
+            `load` callables (or taking them from `context` if already supplied).
+        only: restrict the run to these stage names (their upstream outputs are loaded the same way).
+        parallel: run stages whose dependencies are satisfied concurrently on a thread pool.
+        """
+        context = dict(context or {})
+        self.timings = {}
+        run_start = time.perf_counter()
+        order = self.order()
+
+        skipped = set()
+        if start_from is not None:
+            if start_from not in self.stages:
+                raise ValueError(f"Unknown stage '{start_from}'")
+            skipped = self._upstream(start_from)
+        selected = [name for name in order if name not in skipped]
+        if only is not None:
+            selected = [name for name in selected if name in only]
+            skipped |= set(order) - set(selected)
+
+        for name in order:
+            stage = self.stages[name]
+            if name not in skipped or all(o in context for o in stage.outputs):
+                continue
+            if stage.load is None:
+                continue
+            print(f"Loading outputs of skipped stage '{name}'")
+            context.update(stage.load() or {})
+
+        if not parallel:
+            for name in selected:
+                context.update(self._run_stage(self.stages[name], context))
+        else:
+            done = set()
+            remaining = list(selected)
+            running = {}
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while remaining or running:
+                    # Start every stage whose own dependencies have finished, without waiting for the rest.
+                    for name in [n for n in remaining if (self.dependencies(n) & set(selected)) <= done]:
+                        running[executor.submit(self._run_stage, self.stages[name], dict(context))] = name
+                        remaining.remove(name)
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        context.update(future.result())
+                        done.add(running.pop(future))
+
+        self.wall_time = time.perf_counter() - run_start
+        self.print_timings()
+        return context
+
+    def print_timings(self):
+        if not self.timings:
+            return
+        print("\nStage timings:")
+        for name, seconds in self.timings.items():
+            print(f"  {name:<12} {seconds:8.2f}s")
+        print(f"  {'stages sum':<12} {sum(self.timings.values()):8.2f}s")
+        print(f"  {'wall clock':<12} {self.wall_time:8.2f}s")
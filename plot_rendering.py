@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+from manifest import hash_inputs
+
+MANIFEST_STAGE = "temperature_plots"
+PLOT_PRESETS = {
+    'preview': {'dpi': 72, 'format': 'png'},
+    'publication': {'dpi': 300, 'format': 'png'},
+}
+
+
+def frame_digest(*frames):
+    """Digest of the values, index and column labels of DataFrames / Series."""
+    parts = []
+    for frame in frames:
+        parts.append(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+        labels = frame.columns if isinstance(frame, pd.DataFrame) else [frame.name]
+        parts.append([str(label) for label in labels])
+    return hash_inputs(*parts)
+
+
+def render_trend_plot(daily, yearly, monthly, plot_path, dpi):
+    """Yearly trends, seasonal distribution, monthly patterns and a year x month heatmap for one aim."""
+    fig = plt.figure(figsize=(20, 12))
+
+    ax1 = plt.subplot(2, 2, 1)
+    for metric in ['temperature_mean', 'temperature_max', 'temperature_min']:
+        mean = yearly[metric]['mean']
+        std = yearly[metric]['std']
+        ax1.plot(mean.index, mean.values, marker='o', label=metric)
+        ax1.fill_between(mean.index, mean - 1.96 * std, mean + 1.96 * std, alpha=0.2)
+    ax1.set_title('Yearly Temperature Trends')
+    ax1.legend()
+    ax1.grid(True)
+
+    ax2 = plt.subplot(2, 2, 2)
+    sns.violinplot(data=daily, x='season', y='temperature_mean', ax=ax2)
+    sns.boxplot(data=daily, x='season', y='temperature_mean', ax=ax2, color='white')
+    ax2.set_title('Seasonal Temperature Distribution')
+
+    ax3 = plt.subplot(2, 2, 3)
+    monthly = monthly.reset_index()
+    for year in monthly['year'].unique():
+        y_data = monthly[monthly['year'] == year]
+        ax3.plot(y_data['month'], y_data['temperature_mean'], label=str(year))
+        z = np.polyfit(y_data['month'], y_data['temperature_mean'], 1)
+        ax3.plot(y_data['month'], np.poly1d(z)(y_data['month']), linestyle='--')
+    ax3.set_title('Monthly Temperature Patterns by Year')
+    ax3.legend()
+    ax3.grid(True)
+
+    ax4 = plt.subplot(2, 2, 4)
+    pivot = monthly.pivot(index='year', columns='month', values='temperature_mean')
+    sns.heatmap(pivot, cmap=sns.diverging_palette(220, 10, as_cmap=True), ax=ax4, annot=True, fmt='.1f')
+    ax4.set_title('Temperature Changes Heatmap')
+
+    plt.tight_layout()
+    plt.savefig(plot_path, dpi=dpi)
+    plt.close(fig)
+
+
+def render_seasonal_plot(seasonal, plot_path, dpi):
+    """One bar chart per metric of the seasonal statistics of one aim."""
+    fig, axes = plt.subplots(3, 2, figsize=(16, 12))
+    axes = axes.flatten()
+    metrics = seasonal.columns.get_level_values(0).unique()
+    for idx, metric in enumerate(metrics):
+        seasonal[metric].plot(kind='bar', ax=axes[idx])
+        axes[idx].set_title(f"{metric.capitalize()} by Season")
+        axes[idx].set_ylabel(metric)
+        axes[idx].legend(loc='best')
+        axes[idx].grid(True)
+
+    plt.tight_layout()
+    plt.savefig(plot_path, dpi=dpi)
+    plt.close(fig)
+
+
+RENDERERS = {
+    'trends': render_trend_plot,
+    'seasonal': render_seasonal_plot,
+}
+
+
+def _render(renderer, frames, plot_path, dpi):
+    RENDERERS[renderer](*frames, plot_path=plot_path, dpi=dpi)
+    return plot_path
+
+
+def render_plots(jobs, preset='publication', max_workers=None, manifest=None):
+    """Renders {key: (renderer, frames, base_path)} jobs and returns {key: plot path}.
+
+    `renderer` names an entry in RENDERERS, `frames` are its data arguments and the preset's
+    extension is appended to `base_path`. Jobs run on a process pool unless max_workers is 1.
+    With a manifest, plots whose data and preset are unchanged since they were last rendered
+    are skipped and their existing files returned.
+    """
+    settings = PLOT_PRESETS[preset]
+    plot_paths = {}
+    pending = {}
+    for key, (renderer, frames, base_path) in jobs.items():
+        digest = hash_inputs(renderer, settings, frame_digest(*frames)) if manifest is not None else None
+        if manifest is not None and manifest.is_current(MANIFEST_STAGE, key, digest):
+            plot_paths[key] = manifest.outputs(MANIFEST_STAGE, key)[0]
+            continue
+        pending[key] = (renderer, frames, f"{base_path}.{settings['format']}", digest)
+
+    if manifest is not None and len(pending) < len(jobs):
+        print(f"Skipping {len(jobs) - len(pending)} plots whose data has not changed")
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or len(pending) <= 1:
+        for key, (renderer, frames, plot_path, _) in pending.items():
+            plot_paths[key] = _render(renderer, frames, plot_path, settings['dpi'])
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            futures = {
+                key: executor.submit(_render, renderer, frames, plot_path, settings['dpi'])
+                for key, (renderer, frames, plot_path, _) in pending.items()
+            }
+            for key, future in futures.items():
+                plot_paths[key] = future.result()
+
+    if manifest is not None:
+        for key, (_, _, plot_path, digest) in pending.items():
+            manifest.record(MANIFEST_STAGE, key, digest, [plot_path])
+    return plot_paths
+
+
+def plots_config(config):
+    """(preset, max_workers, skip_unchanged) from the `temperature_plots` section of config.yaml."""
+    section = (config or {}).get('temperature_plots') or {}
+    return section.get('preset', 'publication'), section.get('workers'), section.get('skip_unchanged', False)
@@ -0,0 +1,347 @@
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+from manifest import file_fingerprint
+from model_registry import get_sam_model
+
+MAX_CACHED_EMBEDDINGS = 8
+MAX_BOXES_PER_BATCH = 64
+SAM_MODEL_TYPES = ("vit_b", "vit_l", "vit_h")
+DEFAULT_CHECKPOINTS = {
+    "vit_h": "models/sam_vit_h_4b8939.pth",
+    "vit_l": "models/sam_vit_l_0b3195.pth",
+    "vit_b": "models/sam_vit_b_01ec64.pth",
+}
+DEFAULT_ONNX_DIR = os.path.join("models", "sam_onnx")
+# Normalization and input size SAM's image encoder was trained with.
+PIXEL_MEAN = np.array([123.675, 116.28, 103.53], dtype=np.float32)
+PIXEL_STD = np.array([58.395, 57.12, 57.375], dtype=np.float32)
+ENCODER_INPUT_SIZE = 1024
+
+
+class _EmbeddingCache(ABC):
+    """Keeps the last few image embeddings, keyed by image hash, so re-prompting skips the encoder."""
+
+    def __init__(self, max_cached_embeddings=MAX_CACHED_EMBEDDINGS):
+        self.max_cached_embeddings = max_cached_embeddings
+        self._embeddings = OrderedDict()
+        self._current = None
+
+    def set_image(self, image_np, image_hash):
+        """Makes `image_np` the active image, reusing a cached embedding when the hash was seen before."""
+        if image_hash is not None and image_hash == self._current:
+            return
+        cached = self._embeddings.get(image_hash) if image_hash is not None else None
+        if cached is not None:
+            self._embeddings.move_to_end(image_hash)
+            self._restore(cached)
+        else:
+            state = self._encode(image_np)
+            if image_hash is not None:
+                self._embeddings[image_hash] = state
+            while len(self._embeddings) > self.max_cached_embeddings:
+                self._embeddings.popitem(last=False)
+        self._current = image_hash
+
+    @abstractmethod
+    def _encode(self, image_np):
+        """Runs the image encoder on `image_np`, makes it the active image and returns its cacheable state."""
+
+    @abstractmethod
+    def _restore(self, state):
+        """Makes a state returned by _encode the active image again."""
+
+
+class SamSegmenter(_EmbeddingCache):
+    """PyTorch SAM (vit_b, vit_l or vit_h) that stays resident across images.
+
+    The image encoder runs once per distinct image; every box prompt for that image then goes
+    through the mask decoder in a single batched call.
+    """
+
+    def __init__(self, model_type="vit_h", checkpoint=None, device=None,
+                 max_cached_embeddings=MAX_CACHED_EMBEDDINGS):
+        from segment_anything import SamPredictor
+
+        super().__init__(max_cached_embeddings)
+        self.model_type = model_type
+        self.checkpoint = checkpoint or DEFAULT_CHECKPOINTS[model_type]
+        self.predictor = SamPredictor(get_sam_model(model_type, self.checkpoint, device))
+
+    @property
+    def identity(self):
+        """Describes the weights in use, for manifest digests."""
+        return f"torch:{self.model_type}:{file_fingerprint(self.checkpoint)}"
+
+    def _encode(self, image_np):
+        self.predictor.set_image(image_np)
+        return self.predictor.features, self.predictor.original_size, self.predictor.input_size
+
+    def _restore(self, state):
+        features, original_size, input_size = state
+        self.predictor.reset_image()
+        self.predictor.features = features
+        self.predictor.original_size = original_size
+        self.predictor.input_size = input_size
+        self.predictor.is_image_set = True
+
+    def predict_boxes(self, boxes, batch_size=MAX_BOXES_PER_BATCH):
+        """Returns an (N, H, W) boolean array with one mask per [x0, y0, x1, y1] box of the active image."""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        if len(boxes) == 0:
+            height, width = self.predictor.original_size
+            return np.zeros((0, height, width), dtype=bool)
+
+        masks = []
+        with torch.no_grad():
+            for start in range(0, len(boxes), batch_size):
+                batch = torch.as_tensor(boxes[start:start + batch_size], device=self.predictor.device)
+                batch = self.predictor.transform.apply_boxes_torch(batch, self.predictor.original_size)
+                batch_masks, _, _ = self.predictor.predict_torch(
+                    point_coords=None,
+                    point_labels=None,
+                    boxes=batch,
+                    multimask_output=False,
+                )
+                masks.append(batch_masks[:, 0].cpu().numpy())
+        return np.concatenate(masks)
+
+
+def onnx_paths(onnx_dir, model_type, quantized=True):
+    """(encoder, decoder) paths of an exported model; quantized files carry a '.quant' suffix."""
+    suffix = ".quant" if quantized else ""
+    return (
+        os.path.join(onnx_dir, f"sam_{model_type}_encoder{suffix}.onnx"),
+        os.path.join(onnx_dir, f"sam_{model_type}_decoder{suffix}.onnx"),
+    )
+
+
+class OnnxSamSegmenter(_EmbeddingCache):
+    """SAM encoder / decoder pair exported to ONNX and run with onnxruntime on the CPU.
+
+    The decoder is run once per box; it is cheap next to the encoder, whose output is cached.
+    """
+
+    def __init__(self, model_type="vit_b", onnx_dir=DEFAULT_ONNX_DIR, quantized=True, threads=None,
+                 max_cached_embeddings=MAX_CACHED_EMBEDDINGS):
+        import onnxruntime as ort
+        from segment_anything.utils.transforms import ResizeLongestSide
+
+        super().__init__(max_cached_embeddings)
+        self.model_type = model_type
+        self.quantized = quantized
+        self.encoder_path, self.decoder_path = onnx_paths(onnx_dir, model_type, quantized)
+        for path in (self.encoder_path, self.decoder_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"ONNX model not found at '{path}' (run: python sam_backends.py export {model_type})")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        providers = ["CPUExecutionProvider"]
+        self.encoder = ort.InferenceSession(self.encoder_path, options, providers=providers)
+        self.decoder = ort.InferenceSession(self.decoder_path, options, providers=providers)
+        self.transform = ResizeLongestSide(ENCODER_INPUT_SIZE)
+        self._features = None
+        self._original_size = None
+
+    @property
+    def identity(self):
+        return f"onnx:{file_fingerprint(self.encoder_path)}:{file_fingerprint(self.decoder_path)}"
+
+    def _encode(self, image_np):
+        resized = self.transform.apply_image(image_np).astype(np.float32)
+        normalized = (resized - PIXEL_MEAN) / PIXEL_STD
+        height, width = normalized.shape[:2]
+        padded = np.zeros((ENCODER_INPUT_SIZE, ENCODER_INPUT_SIZE, 3), dtype=np.float32)
+        padded[:height, :width] = normalized
+        features = self.encoder.run(None, {"image": padded.transpose(2, 0, 1)[None]})[0]
+        state = (features, image_np.shape[:2])
+        self._restore(state)
+        return state
+
+    def _restore(self, state):
+        self._features, self._original_size = state
+
+    def predict_boxes(self, boxes):
+        """Returns an (N, H, W) boolean array with one mask per [x0, y0, x1, y1] box of the active image."""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        height, width = self._original_size
+        if len(boxes) == 0:
+            return np.zeros((0, height, width), dtype=bool)
+
+        # A box prompt is its two corners, labelled 2 (top-left) and 3 (bottom-right).
+        corners = self.transform.apply_coords(boxes.reshape(-1, 2, 2), self._original_size).astype(np.float32)
+        labels = np.array([[2, 3]], dtype=np.float32)
+        mask_input = np.zeros((1, 1, 256, 256), dtype=np.float32)
+        has_mask_input = np.zeros(1, dtype=np.float32)
+        orig_im_size = np.array(self._original_size, dtype=np.float32)
+
+        masks = np.empty((len(boxes), height, width), dtype=bool)
+        for i, box_corners in enumerate(corners):
+            box_masks, _, _ = self.decoder.run(None, {
+                "image_embeddings": self._features,
+                "point_coords": box_corners[None],
+                "point_labels": labels,
+                "mask_input": mask_input,
+                "has_mask_input": has_mask_input,
+                "orig_im_size": orig_im_size,
+            })
+            masks[i] = box_masks[0, 0] > 0.0
+        return masks
+
+
+def export_onnx(model_type="vit_b", checkpoint=None, onnx_dir=DEFAULT_ONNX_DIR, quantize=True, opset=17):
+    """Exports the image encoder and the prompt/mask decoder of a SAM checkpoint to ONNX.
+
+    With `quantize`, int8 dynamic-quantized copies are written next to the float models.
+    Returns the (encoder, decoder) paths for the requested precision.
+    """
+    from segment_anything import sam_model_registry
+    from segment_anything.utils.onnx import SamOnnxModel
+
+    checkpoint = checkpoint or DEFAULT_CHECKPOINTS[model_type]
+    os.makedirs(onnx_dir, exist_ok=True)
+    encoder_path, decoder_path = onnx_paths(onnx_dir, model_type, quantized=False)
+    sam = sam_model_registry[model_type](checkpoint=checkpoint).eval()
+
+    print(f"Exporting {model_type} image encoder to: {encoder_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            sam.image_encoder,
+            torch.randn(1, 3, ENCODER_INPUT_SIZE, ENCODER_INPUT_SIZE),
+            encoder_path,
+            input_names=["image"],
+            output_names=["image_embeddings"],
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+
+    print(f"Exporting {model_type} prompt/mask decoder to: {decoder_path}")
+    embed_dim = sam.prompt_encoder.embed_dim
+    embed_size = sam.prompt_encoder.image_embedding_size
+    dummy_inputs = {
+        "image_embeddings": torch.randn(1, embed_dim, *embed_size),
+        "point_coords": torch.randint(0, ENCODER_INPUT_SIZE, (1, 2, 2), dtype=torch.float),
+        "point_labels": torch.tensor([[2, 3]], dtype=torch.float),
+        "mask_input": torch.zeros(1, 1, *[4 * x for x in embed_size]),
+        "has_mask_input": torch.zeros(1),
+        "orig_im_size": torch.tensor([640, 640], dtype=torch.float),
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            SamOnnxModel(sam, return_single_mask=True),
+            tuple(dummy_inputs.values()),
+            decoder_path,
+            input_names=list(dummy_inputs.keys()),
+            output_names=["masks", "iou_predictions", "low_res_masks"],
+            dynamic_axes={"point_coords": {1: "num_points"}, "point_labels": {1: "num_points"}},
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+
+    if not quantize:
+        return encoder_path, decoder_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quant_encoder_path, quant_decoder_path = onnx_paths(onnx_dir, model_type, quantized=True)
+    for source, target in ((encoder_path, quant_encoder_path), (decoder_path, quant_decoder_path)):
+        print(f"Quantizing {source} to int8: {target}")
+        # The vit_l / vit_h encoders exceed the 2 GB protobuf limit and need external weights.
+        quantize_dynamic(source, target, weight_type=QuantType.QInt8,
+                         use_external_data_format=os.path.getsize(source) > 2 ** 31 - 1)
+    return quant_encoder_path, quant_decoder_path
+
+
+def sam_settings(config):
+    """Segmentation backend options from the `sam` section of config.yaml, with defaults."""
+    section = (config or {}).get('sam') or {}
+    model_type = section.get('model_type', 'vit_h')
+    return {
+        'backend': section.get('backend', 'torch'),
+        'model_type': model_type,
+        'checkpoint': section.get('checkpoint') or DEFAULT_CHECKPOINTS.get(model_type),
+        'onnx_dir': section.get('onnx_dir', DEFAULT_ONNX_DIR),
+        'quantized': section.get('quantized', True),
+        'device': section.get('device'),
+    }
+
+
+_segmenters = {}
+
+
+def get_sam_segmenter(model_type="vit_h", checkpoint=None, device=None, backend="torch",
+                      onnx_dir=DEFAULT_ONNX_DIR, quantized=True):
+    """One segmenter per backend configuration in this process, so weights and embedding caches persist."""
+    if model_type not in SAM_MODEL_TYPES:
+        raise ValueError(f"Unknown SAM model type '{model_type}', expected one of {SAM_MODEL_TYPES}")
+    if backend == "torch":
+        checkpoint = checkpoint or DEFAULT_CHECKPOINTS[model_type]
+        key = (backend, model_type, os.path.abspath(checkpoint), device)
+        if key not in _segmenters:
+            _segmenters[key] = SamSegmenter(model_type, checkpoint, device)
+    elif backend == "onnx":
+        key = (backend, model_type, os.path.abspath(onnx_dir), quantized)
+        if key not in _segmenters:
+            _segmenters[key] = OnnxSamSegmenter(model_type, onnx_dir, quantized)
+    else:
+        raise ValueError(f"Unknown SAM backend '{backend}', expected 'torch' or 'onnx'")
+    return _segmenters[key]
+
+
+def segmenter_from_settings(settings):
+    return get_sam_segmenter(settings['model_type'], settings['checkpoint'], settings['device'],
+                             settings['backend'], settings['onnx_dir'], settings['quantized'])
+
+
+def mask_iou(mask_a, mask_b):
+    """Intersection over union of two boolean masks (1.0 when both are empty)."""
+    union = np.logical_or(mask_a, mask_b).sum()
+    if union == 0:
+        return 1.0
+    return float(np.logical_and(mask_a, mask_b).sum() / union)
+
+
+def compare_segmenters(samples, reference, candidates):
+    """Times each segmenter per image and scores its masks against the reference's.
+
+    `samples` is a list of (image_np, image_hash, boxes); `candidates` maps a name to a segmenter.
+    Returns {name: {'seconds_per_image': ..., 'mean_iou': ...}}, with the reference under 'reference'.
+    """
+    def run(segmenter):
+        masks, seconds = [], []
+        for image_np, image_hash, boxes in samples:
+            start = time.perf_counter()
+            segmenter.set_image(image_np, image_hash)
+            masks.append(segmenter.predict_boxes(boxes))
+            seconds.append(time.perf_counter() - start)
+        return masks, float(np.mean(seconds)) if seconds else 0.0
+
+    reference_masks, reference_seconds = run(reference)
+    report = {'reference': {'seconds_per_image': reference_seconds, 'mean_iou': 1.0}}
+    for name, segmenter in candidates.items():
+        masks, seconds = run(segmenter)
+        ious = [
+            mask_iou(candidate, expected)
+            for image_masks, image_reference in zip(masks, reference_masks)
+            for candidate, expected in zip(image_masks, image_reference)
+        ]
+        report[name] = {'seconds_per_image': seconds, 'mean_iou': float(np.mean(ious)) if ious else float('nan')}
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "export" or sys.argv[2] not in SAM_MODEL_TYPES:
+        print("Usage: python sam_backends.py export vit_b|vit_l|vit_h [checkpoint] [--no-quantize]")
+        sys.exit(1)
+
+    export_checkpoint = next((arg for arg in sys.argv[3:] if not arg.startswith("--")), None)
+    export_onnx(sys.argv[2], export_checkpoint, quantize="--no-quantize" not in sys.argv)
@@ -1,15 +1,46 @@
 import os
 import sys
 import yaml
-from PIL import Image, ImageDraw
+from PIL import Image
 import numpy as np
-from segment_anything import sam_model_registry, SamPredictor
+from manifest import file_fingerprint, hash_file, hash_inputs
+from mask_overlay import composite_masks, label_image
+from mask_store import write_masks
+from sam_backends import get_sam_segmenter
 
-def segment_trees_with_sam(image_path, yaml_path, sam_model_type="vit_h", sam_checkpoint="sam_vit_h_870864.pth", output_dir="segmented_trees_output_sam"):
+MANIFEST_STAGE = "tree_segmentation"
+
+
+def segment_trees_with_sam(image_path, yaml_path, sam_model_type="vit_h", sam_checkpoint="sam_vit_h_870864.pth", output_dir="segmented_trees_output_sam", manifest=None, device=None, segmenter=None):
     """
     Segments trees in an image using SAM model, guided by bounding boxes from a YAML file.
+
+    The SAM model stays loaded between calls, the image embedding is cached by image hash and all
+    boxes of the image are decoded in one batch. The masks are saved bit-packed in one npz and
+    blended into the segmented image with array operations. Pass `segmenter` to use another backend from
+    sam_backends (a smaller ViT or the ONNX export) instead of the PyTorch checkpoint.
+
+    With a manifest, nothing is recomputed when the image, the detections YAML and the SAM
+    checkpoint are unchanged since the outputs were last written; the caller is responsible for
+    manifest.save().
     """
     try:
+        manifest_key = f"{os.path.abspath(image_path)} -> {os.path.abspath(output_dir)}"
+        digest = None
+        try:
+            image_hash = hash_file(image_path)
+        except FileNotFoundError:
+            image_hash = None
+        if manifest is not None:
+            try:
+                weights = segmenter.identity if segmenter is not None else (file_fingerprint(sam_checkpoint), sam_model_type)
+                digest = hash_inputs(image_hash, hash_file(yaml_path), weights)
+            except (FileNotFoundError, TypeError):
+                digest = None
+            if digest and manifest.is_current(MANIFEST_STAGE, manifest_key, digest):
+                print(f"Skipping {image_path}: segmentation is up to date")
+                return
+
         
         try:
             with open(yaml_path, 'r') as yaml_file:
@@ -25,11 +56,10 @@ def segment_trees_with_sam(image_path, yaml_path, sam_model_type="vit_h", sam_ch
             return
 
 
-        """  Load SAM Model """
+        """  Load SAM Model (once per process) """
         try:
-            sam = sam_model_registry[sam_model_type](checkpoint=sam_checkpoint)
-            sam.to('cuda' if torch.cuda.is_available() else 'cpu') # getting GPU 
-            predictor = SamPredictor(sam)
+            if segmenter is None:
+                segmenter = get_sam_segmenter(sam_model_type, sam_checkpoint, device)
         except FileNotFoundError:
             print(f"Error: SAM checkpoint file not found at: {sam_checkpoint}") 
             return
@@ -42,7 +72,7 @@ def segment_trees_with_sam(image_path, yaml_path, sam_model_type="vit_h", sam_ch
         try:
             image_pil = Image.open(image_path).convert("RGB")
             image_np = np.array(image_pil)
-            predictor.set_image(image_np)
+            segmenter.set_image(image_np, image_hash)
         except FileNotFoundError:
             print(f"Error: Image file not found at: {image_path}") 
             return
@@ -57,47 +87,28 @@ def segment_trees_with_sam(image_path, yaml_path, sam_model_type="vit_h", sam_ch
         os.makedirs(output_segmented_image_dir, exist_ok=True)
 
 
-        segmented_image_pil = image_pil.copy() 
-
-        for i, detection in enumerate(tree_detections):
-            xh, yh, xw, yw = detection['xh'], detection['yh'], detection['xw'], detection['yw']
-            input_box = np.array([xh, yh, xw, yw]) 
+        input_boxes = [[d['xh'], d['yh'], d['xw'], d['yw']] for d in tree_detections]
+        masks = segmenter.predict_boxes(input_boxes)
+        labels = label_image(masks)
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        written = []
 
-            masks, _, _ = predictor.predict(
-                point_coords=None,
-                point_labels=None,
-                box=input_box,
-                multimask_output=False, 
-            )
-            mask = masks[0] 
+        """  Save all tree masks bit-packed in one file (read back with mask_store.PackedMasks) """
+        masks_filepath = write_masks(os.path.join(output_mask_dir, stem + "_tree_masks.npz"), masks)
+        written.append(masks_filepath)
+        print(f"  Saved {len(masks)} tree masks: {masks_filepath}")
 
+        segmented_image_pil = Image.fromarray(composite_masks(image_np, labels))
 
-            """  Save Segmentation Mask """
-            mask_pil = Image.fromarray(mask) 
-            mask_filename = os.path.splitext(os.path.basename(image_path))[0] + f"_tree_mask_{i+1}.png"
-            mask_filepath = os.path.join(output_mask_dir, mask_filename)
-            mask_pil.save(mask_filepath)
-            print(f"  Saved tree mask: {mask_filepath}")
-
-
-            
-            mask_overlay_color = (0, 255, 0, 150)  
-            segmented_image_draw = ImageDraw.Draw(segmented_image_pil, 'RGBA')
-
-            
-            contours = find_contours(mask, level=0.5, fully_connected='high') 
-            for n, contour in enumerate(contours):
-                for l in range(0, len(contour), 1): 
-                    x_PIL, y_PIL = tuple(np.flip(contour[l], axis=0)) 
-                    segmented_image_draw.point((x_PIL, y_PIL), fill=mask_overlay_color) 
-
-
-        
-        segmented_image_filename = os.path.splitext(os.path.basename(image_path))[0] + "_segmented.jpg"
+        segmented_image_filename = stem + "_segmented.jpg"
         segmented_image_filepath = os.path.join(output_segmented_image_dir, segmented_image_filename)
         segmented_image_pil.save(segmented_image_filepath)
+        written.append(segmented_image_filepath)
         print(f"Segmented image saved: {segmented_image_filepath}")
 
+        if manifest is not None and digest:
+            manifest.record(MANIFEST_STAGE, manifest_key, digest, written)
+
 
     except Exception as e: 
         print(f"An unexpected error occurred during segmentation: {e}")
@@ -106,9 +117,6 @@ def segment_trees_with_sam(image_path, yaml_path, sam_model_type="vit_h", sam_ch
 
 
 if __name__ == "__main__":
-    import torch 
-    from skimage.measure import find_contours 
-
     image_path = "data/coordinate_54.975056,-1.591944_images/street_view_0.jpg" 
     yaml_path = "detected_trees_output_yolo_class/street_view_0_tree_detections.yaml" 
     sam_checkpoint = "models/sam_vit_h_4b8939.pth" 
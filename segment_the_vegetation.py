@@ -3,37 +3,149 @@ import numpy as np
 from PIL import Image
 import matplotlib.pyplot as plt
 import os
+import sys
+from mask_store import PackedMasks, write_masks
+
+MODEL_PATH = 'models/cityscapes_fan_tiny_hybrid_224.onnx'
+INPUT_SIZE = 224
+DEFAULT_BATCH_SIZE = 8
+TREE_CLASS_ID = 8
+TILE_OVERLAP = 32
+TILE_MEMORY_BUDGET_MB = 256
+# Resident bytes per tile pixel: the float32 RGB input plus worst-case float32 logits for 19 classes.
+TILE_BYTES_PER_PIXEL = 3 * 4 + 19 * 4
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+class VegetationSegmenter:
+    """ONNX Runtime session for the vegetation model, created once and reused for every batch.
+
+    Nothing is loaded at import time; build one with the threading, optimization and execution
+    provider settings the worker should use.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, intra_op_threads=None, inter_op_threads=None,
+                 optimization_level='all', providers=None):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[optimization_level]
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.session = ort.InferenceSession(model_path, options, providers=providers or ort.get_available_providers())
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+        # Models exported with a fixed batch dimension of 1 are fed one image at a time.
+        self.max_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+    def run(self, batch):
+        """Runs an (N, 3, H, W) float32 batch and returns the N class maps stacked on axis 0."""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        step = self.max_batch or len(batch)
+        outputs = [
+            self.session.run([self.output_name], {self.input_name: batch[start:start + step]})[0]
+            for start in range(0, len(batch), step)
+        ]
+        return np.concatenate(outputs)
 
-model_path = 'models/cityscapes_fan_tiny_hybrid_224.onnx'
-session = ort.InferenceSession(model_path)
 
 def preprocess_image(image_path):
-    img = Image.open(image_path).convert("RGB")
-    img = img.resize((224, 224))
+    return preprocess_pil(Image.open(image_path))
+
+def preprocess_pil(image):
+    img = image.convert("RGB").resize((INPUT_SIZE, INPUT_SIZE))
     img = np.array(img).astype(np.float32)
     img = img / 255.0
     img = np.transpose(img, (2, 0, 1))
     img = np.expand_dims(img, axis=0)
     return img
 
-def run_inference(session, img):
-    input_name = session.get_inputs()[0].name
-    output_name = session.get_outputs()[0].name
-    result = session.run([output_name], {input_name: img})
-    return result[0]
+def preprocess_batch(images):
+    """Stacks PIL images into one (N, 3, 224, 224) NCHW batch."""
+    return np.concatenate([preprocess_pil(image) for image in images])
 
-def overlay_tree_segmentation(original_image, mask):
+def tree_mask_at_size(mask, size):
+    """Boolean vegetation mask of the model output, resized to `size` (width, height)."""
     mask = mask.squeeze()
-    tree_class_id = 8
-    tree_mask = np.where(mask == tree_class_id, 1, 0)
-    tree_mask = Image.fromarray(tree_mask.astype(np.uint8) * 255)
-    tree_mask = tree_mask.resize(original_image.size, Image.NEAREST)
-    alpha = tree_mask.convert("L").point(lambda p: p * 0.5)
+    tree_mask = Image.fromarray((mask == TREE_CLASS_ID).astype(np.uint8) * 255)
+    return np.array(tree_mask.resize(size, Image.NEAREST)) > 0
+
+def tree_scores(outputs):
+    """Per-pixel tree score for a batch of model outputs; positive where the tree class wins.
+
+    For logit outputs (N, C, H, W) this is the margin of the tree logit over the best other class,
+    so blending it across tiles stays single-channel; class-map outputs score +1 / -1.
+    """
+    if outputs.ndim == 4 and outputs.shape[1] > 1:
+        others = np.delete(outputs, TREE_CLASS_ID, axis=1).max(axis=1)
+        return (outputs[:, TREE_CLASS_ID] - others).astype(np.float32)
+    is_tree = outputs.reshape(len(outputs), *outputs.shape[-2:]) == TREE_CLASS_ID
+    return np.where(is_tree, 1.0, -1.0).astype(np.float32)
+
+def tile_origins(length, tile_size, overlap):
+    """Start offsets of tiles covering [0, length), the last one flush with the end."""
+    if length <= tile_size:
+        return [0]
+    stride = max(1, tile_size - overlap)
+    origins = list(range(0, length - tile_size, stride))
+    return origins + [length - tile_size]
+
+def blend_window(tile_size, overlap):
+    """Weights that taper linearly across the overlap so neighbouring tiles cross-fade."""
+    ramp = np.ones(tile_size, dtype=np.float32)
+    if overlap > 0:
+        edge = np.linspace(1.0 / (overlap + 1), 1.0, overlap, endpoint=False, dtype=np.float32)
+        ramp[:overlap] = edge
+        ramp[-overlap:] = edge[::-1]
+    return np.outer(ramp, ramp)
+
+def segment_tiled(segmenter, image, tile_size=INPUT_SIZE, overlap=TILE_OVERLAP, memory_budget_mb=TILE_MEMORY_BUDGET_MB):
+    """Boolean tree mask of `image` at its native resolution from overlapping model-sized tiles.
+
+    Tiles are run as batches of as many tiles as fit in `memory_budget_mb`; their tree scores are
+    blended where they overlap and a pixel is a tree where the blended score is positive.
+    """
+    pixels = np.asarray(image.convert("RGB"), dtype=np.float32) / 255.0
+    height, width = pixels.shape[:2]
+    # Frames smaller than a tile are padded up to one.
+    padded_height, padded_width = max(height, tile_size), max(width, tile_size)
+    if (padded_height, padded_width) != (height, width):
+        pixels = np.pad(pixels, ((0, padded_height - height), (0, padded_width - width), (0, 0)), mode='edge')
+
+    origins = [(y, x) for y in tile_origins(padded_height, tile_size, overlap)
+               for x in tile_origins(padded_width, tile_size, overlap)]
+    window = blend_window(tile_size, overlap)
+    scores = np.zeros((padded_height, padded_width), dtype=np.float32)
+    weights = np.zeros((padded_height, padded_width), dtype=np.float32)
+    tiles_per_batch = max(1, memory_budget_mb * 1024 * 1024 // (tile_size * tile_size * TILE_BYTES_PER_PIXEL))
+
+    for start in range(0, len(origins), tiles_per_batch):
+        batch_origins = origins[start:start + tiles_per_batch]
+        batch = np.stack([pixels[y:y + tile_size, x:x + tile_size] for y, x in batch_origins]).transpose(0, 3, 1, 2)
+        for (y, x), tile_scores in zip(batch_origins, tree_scores(segmenter.run(batch))):
+            scores[y:y + tile_size, x:x + tile_size] += tile_scores * window
+            weights[y:y + tile_size, x:x + tile_size] += window
+
+    return (scores / weights)[:height, :width] > 0
+
+def overlay_tree_mask(original_image, tree_mask):
+    """Tints the pixels of a native-resolution boolean tree mask light green."""
+    alpha = Image.fromarray(tree_mask.astype(np.uint8) * 127)
     tree_rgb = Image.new("RGB", original_image.size, (144, 238, 144))
     tree_rgb.putalpha(alpha)
     combined = Image.alpha_composite(original_image.convert("RGBA"), tree_rgb)
     return combined
 
+def overlay_tree_segmentation(original_image, mask):
+    return overlay_tree_mask(original_image, tree_mask_at_size(mask, original_image.size))
+
 def create_panorama(image_paths, output_dir):
     if not image_paths:
         return
@@ -54,23 +166,46 @@ def create_panorama(image_paths, output_dir):
     except Exception as e:
         print(f"Error creating panorama: {e}")
 
-input_directory = 'data\coordinate_54.975056,-1.591944_images'
-output_directory = 'segmented_trees'
-os.makedirs(output_directory, exist_ok=True)
+def segment_directory(input_directory, output_directory, segmenter=None, batch_size=DEFAULT_BATCH_SIZE,
+                      tiled=False, overlap=TILE_OVERLAP, memory_budget_mb=TILE_MEMORY_BUDGET_MB):
+    """Segments vegetation in every image of a folder.
+
+    By default each image is downscaled to the model input and `batch_size` images share an
+    inference call. With `tiled`, each image is segmented at full resolution with segment_tiled,
+    which keeps small street trees that the downscaled pass loses.
+    """
+    segmenter = segmenter or VegetationSegmenter()
+    os.makedirs(output_directory, exist_ok=True)
+    filenames = [
+        filename for filename in sorted(os.listdir(input_directory))
+        if filename.endswith('.jpg') or filename.endswith('.png')
+    ]
 
-image_paths = []
+    image_paths = []
+    for start in range(0, len(filenames), 1 if tiled else batch_size):
+        batch_filenames = filenames[start:start + (1 if tiled else batch_size)]
+        originals = [Image.open(os.path.join(input_directory, filename)).convert("RGB") for filename in batch_filenames]
+        if tiled:
+            tree_masks = [segment_tiled(segmenter, originals[0], overlap=overlap, memory_budget_mb=memory_budget_mb)]
+        else:
+            masks = segmenter.run(preprocess_batch(originals))
+            tree_masks = [tree_mask_at_size(mask, image.size) for mask, image in zip(masks, originals)]
+        for filename, original_image, tree_mask in zip(batch_filenames, originals, tree_masks):
+            result_image = overlay_tree_mask(original_image, tree_mask)
+            mask_path = os.path.join(output_directory, filename.split('.')[0] + '_tree_mask.npz')
+            write_masks(mask_path, tree_mask[None])
+            canopy = PackedMasks(mask_path).canopy_statistics()
+            print(f"{filename}: canopy cover {canopy['canopy_fraction']:.1%}")
+            output_path = os.path.join(output_directory, filename.split('.')[0] + '.png')
+            result_image.save(output_path)
+            image_paths.append(output_path)
 
-for filename in os.listdir(input_directory):
-    if filename.endswith('.jpg') or filename.endswith('.png'):
-        image_path = os.path.join(input_directory, filename)
-        original_image = Image.open(image_path).convert("RGB")
-        preprocessed_image = preprocess_image(image_path)
-        mask = run_inference(session, preprocessed_image)
-        result_image = overlay_tree_segmentation(original_image, mask)
-        output_path = os.path.join(output_directory, filename.split('.')[0] + '.png')
-        result_image.save(output_path)
-        image_paths.append(output_path)
+    create_panorama(image_paths, output_directory)
+    return image_paths
 
-create_panorama(image_paths, output_directory)
 
-print("Segmentation completed and saved in the 'segmented_trees' directory.")
+if __name__ == "__main__":
+    input_directory = 'data\\coordinate_54.975056,-1.591944_images'
+    output_directory = 'segmented_trees'
+    segment_directory(input_directory, output_directory, tiled="--tiled" in sys.argv)
+    print("Segmentation completed and saved in the 'segmented_trees' directory.")
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry.polygon import Polygon
+
+
+def polygon_from_latlon(polygon_coords):
+    """Builds a shapely polygon from (lat, lon) pairs, as used for the heatmap study areas."""
+    return Polygon([(lon, lat) for lat, lon in polygon_coords])
+
+
+def points_within_polygons(x, y, polygons):
+    """Returns a boolean mask of the (x, y) points that fall strictly inside any of `polygons`."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mask = np.zeros(x.shape, dtype=bool)
+    for polygon in polygons:
+        shapely.prepare(polygon)
+        mask |= shapely.contains_xy(polygon, x, y)
+    return mask
+
+
+def filter_nodes_within_polygons(nodes, polygons, x_col='x', y_col='y'):
+    """Returns the rows of a node table whose (x, y) lie inside any of the polygons, as a DataFrame.
+
+    `polygons` may be a single shapely polygon or a list of them. Node ids (the index) and every
+    column are preserved, matching the old row-by-row loop.
+    """
+    if isinstance(polygons, shapely.Geometry):
+        polygons = [polygons]
+
+    mask = points_within_polygons(nodes[x_col].to_numpy(), nodes[y_col].to_numpy(), polygons)
+    return pd.DataFrame(nodes[mask])
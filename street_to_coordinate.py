@@ -1,36 +1,52 @@
+import argparse
+import csv
 import requests
 import yaml
 import os
+from download_engine import DownloadEngine
+from geocode_cache import GeocodeCache, normalize_address
+from location_store import get_location_store
 
 CONFIG_FILE_PATH = "config.yaml"
 COORDINATES_FILE_PATH = "coordinates.yaml"
 
-# Load API key from config.yaml
-try:
-    with open(CONFIG_FILE_PATH, 'r') as config_file:
-        config = yaml.safe_load(config_file)
-        api_key = config.get('api_key')
-except FileNotFoundError:
-    print(f"Error: Configuration file '{CONFIG_FILE_PATH}' not found.")
-    exit()
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+MAX_WORKERS = 8
+REQUESTS_PER_SECOND = 10
+# Statuses that will not change on a retry and are therefore worth caching.
+CACHEABLE_STATUSES = {"OK", "ZERO_RESULTS"}
 
-if not api_key:
-    print("Error: API key not found in configuration file.")
-    exit()
 
+def load_api_key(config_path=CONFIG_FILE_PATH):
+    """Load API key from config.yaml."""
+    try:
+        with open(config_path, 'r') as config_file:
+            config = yaml.safe_load(config_file)
+            return config.get('api_key')
+    except FileNotFoundError:
+        print(f"Error: Configuration file '{config_path}' not found.")
+        return None
 
-def get_coordinates(address, api_key):
-    """Fetch coordinates using Google Maps Geocoding API."""
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={api_key}"
-    response = requests.get(url)
+
+def geocode_address(address, api_key, session=None):
+    """Query the Geocoding API. Returns (status, lat, lng); lat/lng are None unless status is OK."""
+    response = (session or requests).get(GEOCODE_URL, params={"address": address, "key": api_key})
     data = response.json()
 
     if data["status"] == "OK":
         lat = data["results"][0]["geometry"]["location"]["lat"]
         lng = data["results"][0]["geometry"]["location"]["lng"]
+        return data["status"], lat, lng
+    return data["status"], None, None
+
+
+def get_coordinates(address, api_key, session=None):
+    """Fetch coordinates using Google Maps Geocoding API."""
+    status, lat, lng = geocode_address(address, api_key, session)
+    if status == "OK":
         return lat, lng
     else:
-        print(f"Error: {data['status']}")
+        print(f"Error: {status}")
         return None, None
 
 
@@ -39,59 +55,226 @@ def extract_street_name(address):
     return address.split(",")[0].strip()
 
 
-# Ask user if they want to enter an address
-choice = input("Do you want to enter an address? (yes/no): ").strip().lower()
-
-if choice == 'yes':
-    address = input("Enter address (e.g., 'Ouseburn Road, Newcastle upon Tyne, UK'): ").strip()
-    lat, lng = get_coordinates(address, api_key)
-elif choice == 'no':
-    try:
-        lat = float(input("Enter latitude: ").strip())
-        lng = float(input("Enter longitude: ").strip())
-        address = f"Coordinates entered manually ({lat}, {lng})"
-    except ValueError:
-        print("Invalid input. Latitude and longitude must be numbers.")
-        exit()
-else:
-    print("Invalid choice. Please enter 'yes' or 'no'.")
-    exit()
-
-if lat and lng:
-    print(f"Latitude: {lat}, Longitude: {lng}")
-
-    # Load existing coordinates
-    if os.path.exists(COORDINATES_FILE_PATH):
-        with open(COORDINATES_FILE_PATH, 'r') as file:
+def load_coordinates_data(coordinates_path=COORDINATES_FILE_PATH):
+    """Load existing coordinates, or an empty mapping if there are none yet."""
+    if os.path.exists(coordinates_path):
+        with open(coordinates_path, 'r') as file:
             try:
-                coordinates_data = yaml.safe_load(file) or {}
+                return yaml.safe_load(file) or {}
             except yaml.YAMLError as e:
                 print(f"Error reading YAML: {e}")
-                coordinates_data = {}
-    else:
-        coordinates_data = {}
+                return {}
+    return {}
 
-    # Generate key
-    if choice == 'yes':
-        street_name = extract_street_name(address)
-        existing_aims = [key for key in coordinates_data if key.lower().startswith("aim ")]
-        next_number = len(existing_aims) + 1
-        aim_key = f"Aim {next_number} {street_name}"
-    else:
-        aim_key = f"AIM_{lat}_{lng}"
 
-    # Save coordinates
+def count_aims(coordinates_data):
+    return sum(1 for key in coordinates_data if key.lower().startswith("aim "))
+
+
+def make_aim_key(address, lat, lng, from_address, aim_number):
+    if from_address:
+        return f"Aim {aim_number} {extract_street_name(address)}"
+    return f"AIM_{lat}_{lng}"
+
+
+def add_coordinate(coordinates_data, address, lat, lng, from_address=True, aim_number=None):
+    """Add a location under the next free aim key and return that key."""
+    if aim_number is None:
+        aim_number = count_aims(coordinates_data) + 1
+    aim_key = make_aim_key(address, lat, lng, from_address, aim_number)
+
     coordinates_data[aim_key] = {
         'address': address,
         'latitude': lat,
         'longitude': lng
     }
+    return aim_key
+
 
+def save_coordinates_data(coordinates_data, coordinates_path=COORDINATES_FILE_PATH):
+    """Write coordinates.yaml atomically, so an interrupted run never leaves it half written."""
+    tmp_path = f"{coordinates_path}.tmp"
     try:
-        with open(COORDINATES_FILE_PATH, 'w') as coordinates_file:
+        with open(tmp_path, 'w') as coordinates_file:
             yaml.dump(coordinates_data, coordinates_file, sort_keys=False)
-        print(f"Coordinates saved to '{COORDINATES_FILE_PATH}' as '{aim_key}'")
+        os.replace(tmp_path, coordinates_path)
+        return True
     except Exception as e:
         print(f"Error saving coordinates: {e}")
-else:
-    print("Could not retrieve coordinates.")
+        return False
+
+
+def prompt_for_location(api_key):
+    """Ask the user for an address or raw coordinates. Returns (address, lat, lng, from_address)."""
+    choice = input("Do you want to enter an address? (yes/no): ").strip().lower()
+
+    if choice == 'yes':
+        address = input("Enter address (e.g., 'Ouseburn Road, Newcastle upon Tyne, UK'): ").strip()
+        lat, lng = get_coordinates(address, api_key)
+        return address, lat, lng, True
+    elif choice == 'no':
+        try:
+            lat = float(input("Enter latitude: ").strip())
+            lng = float(input("Enter longitude: ").strip())
+            return f"Coordinates entered manually ({lat}, {lng})", lat, lng, False
+        except ValueError:
+            print("Invalid input. Latitude and longitude must be numbers.")
+            return None, None, None, False
+    else:
+        print("Invalid choice. Please enter 'yes' or 'no'.")
+        return None, None, None, False
+
+
+def geocode_interactive(api_key, coordinates_path=COORDINATES_FILE_PATH, store=None):
+    """Prompt for one location, append it to the location store (or coordinates.yaml) and return all coordinates."""
+    address, lat, lng, from_address = prompt_for_location(api_key)
+
+    if not (lat and lng):
+        print("Could not retrieve coordinates.")
+        return None
+
+    print(f"Latitude: {lat}, Longitude: {lng}")
+
+    if store is not None:
+        aim_key = make_aim_key(address, lat, lng, from_address, store.count_aims() + 1)
+        store.add(aim_key, address, lat, lng)
+        print(f"Coordinates saved to '{store.path}' as '{aim_key}'")
+        return store.all()
+
+    coordinates_data = load_coordinates_data(coordinates_path)
+    aim_key = add_coordinate(coordinates_data, address, lat, lng, from_address)
+
+    if save_coordinates_data(coordinates_data, coordinates_path):
+        print(f"Coordinates saved to '{coordinates_path}' as '{aim_key}'")
+    return coordinates_data
+
+
+def read_addresses(input_path):
+    """Read addresses from a CSV with an 'address' column, or from a text file with one address per line."""
+    with open(input_path, 'r', newline='', encoding='utf-8') as file:
+        if input_path.lower().endswith(".csv"):
+            reader = csv.DictReader(file)
+            column = next((name for name in (reader.fieldnames or []) if name.strip().lower() == "address"), None)
+            if column is None:
+                raise ValueError(f"'{input_path}' has no 'address' column")
+            addresses = [row[column] for row in reader]
+        else:
+            addresses = file.read().splitlines()
+    return [address.strip() for address in addresses if address and address.strip()]
+
+
+def geocode_addresses(addresses, api_key, cache=None, max_workers=MAX_WORKERS, requests_per_second=REQUESTS_PER_SECOND):
+    """Geocode many addresses concurrently under a global rate limit.
+
+    Addresses are deduplicated on their normalized form and served from the cache where possible.
+    Returns {normalized address: (status, lat, lng)}.
+    """
+    unique = {}
+    for address in addresses:
+        unique.setdefault(normalize_address(address), address)
+
+    results = {}
+    to_fetch = []
+    for key, address in unique.items():
+        cached = cache.get(address) if cache is not None else None
+        if cached is not None:
+            results[key] = cached
+        else:
+            to_fetch.append((address,))
+    print(f"{len(unique)} unique addresses: {len(results)} cached, {len(to_fetch)} to geocode")
+
+    def fetch(address, session):
+        try:
+            status, lat, lng = geocode_address(address, api_key, session)
+        except Exception as e:
+            print(f"Error geocoding '{address}': {e}")
+            return "ERROR", None, None
+        if cache is not None and status in CACHEABLE_STATUSES:
+            cache.put(address, status, lat, lng)
+        return status, lat, lng
+
+    with DownloadEngine(max_workers=max_workers, requests_per_second=requests_per_second) as engine:
+        fetched = engine.run(fetch, to_fetch)
+
+    for (address,), result in zip(to_fetch, fetched):
+        results[normalize_address(address)] = result
+    return results
+
+
+def geocode_batch(input_path, api_key, coordinates_path=COORDINATES_FILE_PATH, cache=None, store=None):
+    """Geocode every address in a file and add the new ones in a single write.
+
+    With a location store the new rows are appended in one transaction; otherwise coordinates.yaml
+    is rewritten once, atomically.
+    """
+    addresses = read_addresses(input_path)
+    results = geocode_addresses(addresses, api_key, cache)
+
+    if store is not None:
+        coordinates_data = {}
+        known = store.address_keys()
+        next_number = store.count_aims() + 1
+    else:
+        coordinates_data = load_coordinates_data(coordinates_path)
+        known = {normalize_address(str(entry.get('address', ''))) for entry in coordinates_data.values()}
+        next_number = count_aims(coordinates_data) + 1
+    added = 0
+    failed = 0
+
+    for address in addresses:
+        key = normalize_address(address)
+        if key in known:
+            continue
+        known.add(key)
+        status, lat, lng = results[key]
+        if status != "OK":
+            print(f"Could not geocode '{address}': {status}")
+            failed += 1
+            continue
+        add_coordinate(coordinates_data, address, lat, lng, aim_number=next_number)
+        next_number += 1
+        added += 1
+
+    if not added:
+        print(f"No new locations to add ({failed} failed)")
+    elif store is not None:
+        store.add_many(
+            (aim_key, entry['address'], entry['latitude'], entry['longitude'])
+            for aim_key, entry in coordinates_data.items()
+        )
+        print(f"Added {added} locations to '{store.path}' ({failed} failed)")
+    elif save_coordinates_data(coordinates_data, coordinates_path):
+        print(f"Added {added} locations to '{coordinates_path}' ({failed} failed)")
+    return store.all() if store is not None else coordinates_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert addresses to coordinates in coordinates.yaml.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="CSV with an 'address' column, or a text file with one address per line.")
+    args = parser.parse_args()
+
+    api_key = load_api_key()
+    if not api_key:
+        print("Error: API key not found in configuration file.")
+        exit()
+
+    store = get_location_store()
+    try:
+        if args.batch:
+            cache = GeocodeCache()
+            try:
+                geocode_batch(args.batch, api_key, cache=cache, store=store)
+            finally:
+                cache.close()
+            return
+
+        if geocode_interactive(api_key, store=store) is None:
+            exit()
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+
+import pandas as pd
+
+DEFAULT_DATASET_DIR = "temperature_dataset"
+SEASONS = ['Winter', 'Spring', 'Summer', 'Autumn']
+MONTH_SEASONS = {
+    12: 'Winter', 1: 'Winter', 2: 'Winter',
+    3: 'Spring', 4: 'Spring', 5: 'Spring',
+    6: 'Summer', 7: 'Summer', 8: 'Summer',
+    9: 'Autumn', 10: 'Autumn', 11: 'Autumn'
+}
+MEASUREMENT_COLUMNS = ['temperature_max', 'temperature_min', 'temperature_mean', 'humidity', 'precipitation']
+
+
+def season_column(months):
+    """Categorical season for a series of month numbers, ordered Winter to Autumn."""
+    return pd.Categorical(pd.Series(months).map(MONTH_SEASONS), categories=SEASONS, ordered=True)
+
+
+def columnar_frame(df):
+    """Typed copy of daily temperatures for one or more aims.
+
+    `df` carries the raw daily columns plus aim_id, address, latitude and longitude, as produced by
+    joining the daily rows with the aim location table.
+    """
+    frame = pd.DataFrame({'date': pd.to_datetime(df['date'])}, index=df.index)
+    for column in MEASUREMENT_COLUMNS:
+        frame[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    frame['aim_id'] = df['aim_id'].astype(str)
+    frame['address'] = df['address'].fillna('').astype('string')
+    frame['latitude'] = df['latitude'].astype('float64')
+    frame['longitude'] = df['longitude'].astype('float64')
+    frame['month'] = frame['date'].dt.month.astype('int8')
+    frame['year'] = frame['date'].dt.year.astype('int16')
+    frame['season'] = season_column(frame['month'].to_numpy())
+    return frame.reset_index(drop=True)
+
+
+def write_temperature_dataset(frames, dataset_path):
+    """Writes columnar frames to a Parquet dataset partitioned by aim_id and year.
+
+    Partitions for the aims and years being written are replaced; all others are left alone.
+    """
+    if not frames:
+        return dataset_path
+    os.makedirs(dataset_path, exist_ok=True)
+    pd.concat(frames, ignore_index=True).to_parquet(
+        dataset_path,
+        partition_cols=['aim_id', 'year'],
+        index=False,
+        existing_data_behavior='delete_matching',
+    )
+    return dataset_path
+
+
+def read_temperature_dataset(dataset_path, aim_id=None, columns=None):
+    """Reads the dataset back, optionally only one aim's partitions and a subset of columns."""
+    filters = [('aim_id', '==', aim_id)] if aim_id is not None else None
+    frame = pd.read_parquet(dataset_path, columns=columns, filters=filters)
+    # Partition keys come back as dictionary-encoded strings; restore their stored types.
+    if 'aim_id' in frame.columns:
+        frame['aim_id'] = frame['aim_id'].astype(str)
+    if 'year' in frame.columns:
+        frame['year'] = frame['year'].astype('int16')
+    if 'season' in frame.columns:
+        frame['season'] = pd.Categorical(frame['season'], categories=SEASONS, ordered=True)
+    sort_columns = [column for column in ('aim_id', 'date') if column in frame.columns]
+    if sort_columns:
+        frame = frame.sort_values(sort_columns, kind='stable', ignore_index=True)
+    return frame
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+from temperature_dataset import MEASUREMENT_COLUMNS, SEASONS, season_column
+
+SEASONAL_AGGREGATIONS = {
+    'temperature_mean': ['mean', 'min', 'max', 'std'],
+    'temperature_max': ['mean', 'min', 'max', 'std'],
+    'temperature_min': ['mean', 'min', 'max', 'std'],
+    'humidity': ['mean', 'min', 'max', 'std'],
+    'precipitation': ['sum', 'mean', 'max', 'std']
+}
+LOCATION_COLUMNS = ['address', 'latitude', 'longitude']
+YEARLY_AGGREGATIONS = {
+    'temperature_mean': ['mean', 'std'],
+    'temperature_max': ['mean', 'std'],
+    'temperature_min': ['mean', 'std']
+}
+
+
+def location_table(coordinates_list):
+    """Aim locations as a DataFrame indexed by aim_id, for joining onto daily and summary data."""
+    table = pd.DataFrame(coordinates_list, columns=['aim_id'] + LOCATION_COLUMNS)
+    return table.drop_duplicates('aim_id', keep='last').set_index('aim_id')
+
+
+def add_calendar_fields(df):
+    """Adds month, year and a categorical season column, in place, and returns the frame."""
+    df['month'] = df['date'].dt.month
+    df['year'] = df['date'].dt.year
+    df['season'] = season_column(df['month'].to_numpy())
+    return df
+
+
+def combine_aims(detailed_data):
+    """Concatenates {aim_id: daily frame} into one frame with an aim_id column and calendar fields."""
+    daily = pd.concat(detailed_data, names=['aim_id', None]).reset_index(level='aim_id').reset_index(drop=True)
+    return add_calendar_fields(daily)
+
+
+def monthly_moments(daily, columns=MEASUREMENT_COLUMNS):
+    """One groupby over (aim_id, year, month) collecting count, sum, sum of squares, min and max.
+
+    Every coarser aggregate is rolled up from these partial moments instead of regrouping the daily rows.
+    """
+    squares = {f"{column}__sq": daily[column] ** 2 for column in columns}
+    spec = {column: ['count', 'sum', 'min', 'max'] for column in columns}
+    spec.update({square: ['sum'] for square in squares})
+    grouped = daily.assign(**squares).groupby(['aim_id', 'year', 'month']).agg(spec)
+
+    moments = {}
+    for column in columns:
+        moments[(column, 'count')] = grouped[(column, 'count')]
+        moments[(column, 'sum')] = grouped[(column, 'sum')]
+        moments[(column, 'sumsq')] = grouped[(f"{column}__sq", 'sum')]
+        moments[(column, 'min')] = grouped[(column, 'min')]
+        moments[(column, 'max')] = grouped[(column, 'max')]
+    return pd.DataFrame(moments)
+
+
+def _roll_up(moments, keys):
+    rule = {'count': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max'}
+    return moments.groupby(keys, observed=True).agg({column: rule[column[1]] for column in moments.columns})
+
+
+def _finalize(rolled, aggregations):
+    """Turns rolled-up moments into the (metric, stat) columns pandas' groupby().agg() would return."""
+    result = {}
+    for metric, stats in aggregations.items():
+        count = rolled[(metric, 'count')]
+        total = rolled[(metric, 'sum')]
+        for stat in stats:
+            if stat == 'mean':
+                values = total / count.where(count > 0)
+            elif stat == 'std':
+                variance = (rolled[(metric, 'sumsq')] - total ** 2 / count) / (count - 1).where(count > 1)
+                values = np.sqrt(variance.clip(lower=0))
+            else:
+                values = rolled[(metric, stat)]
+            result[(metric, stat)] = values
+    return pd.DataFrame(result)
+
+
+def compute_temperature_stats(detailed_data, seasonal_aggregations=SEASONAL_AGGREGATIONS,
+                              yearly_aggregations=YEARLY_AGGREGATIONS):
+    """Derives calendar fields once for all aims and computes every aggregate the writers and plots use.
+
+    Returns a dict with:
+      daily    - all aims' daily rows with aim_id, month, year and season
+      seasonal - (aim_id, season) x (metric, stat)
+      yearly   - (aim_id, year) x (metric, stat)
+      monthly  - (aim_id, year, month) mean of temperature_mean
+    """
+    daily = combine_aims(detailed_data)
+    moments = monthly_moments(daily)
+
+    seasonal_moments = moments.copy()
+    seasonal_moments['season'] = season_column(moments.index.get_level_values('month').to_numpy())
+    seasonal_moments = seasonal_moments.set_index('season', append=True).droplevel(['year', 'month'])
+
+    monthly = moments[('temperature_mean', 'sum')] / moments[('temperature_mean', 'count')].where(
+        moments[('temperature_mean', 'count')] > 0)
+    return {
+        'daily': daily,
+        'seasonal': _finalize(_roll_up(seasonal_moments, ['aim_id', 'season']), seasonal_aggregations),
+        'yearly': _finalize(_roll_up(moments, ['aim_id', 'year']), yearly_aggregations),
+        'monthly': monthly.rename('temperature_mean'),
+    }
+
+
+def seasonal_statistics_table(stats, locations, decimals=2):
+    """Wide per-aim table with one '<season>_<metric>_<stat>' column per seasonal aggregate.
+
+    `locations` is the aim location table from location_table().
+    """
+    seasonal = stats['seasonal'].round(decimals)
+    observed = set(seasonal.index.get_level_values('season'))
+    seasons = [season for season in SEASONS if season in observed]
+
+    wide = seasonal.unstack('season')
+    wide = wide.loc[[aim_id for aim_id in pd.unique(stats['daily']['aim_id']) if aim_id in wide.index]]
+    wide = wide[[(metric, stat, season) for season in seasons for metric, stat in seasonal.columns]]
+    wide.columns = [f"{season.lower()}_{metric}_{stat}" for metric, stat, season in wide.columns]
+
+    info = locations.reindex(wide.index)[LOCATION_COLUMNS]
+    return info.join(wide).rename_axis('aim_id').reset_index()
+
+
+def temperature_summary(stats, locations, decimals=None, include_std=False):
+    """Per-aim summary records (lat, lng, avg_temp, aim_id, address) from one join onto the location table."""
+    summary = stats['daily'].groupby('aim_id', sort=False)['temperature_mean'].agg(['mean', 'std'])
+    summary.columns = ['avg_temp', 'std_temp']
+    if decimals is not None:
+        summary = summary.round(decimals)
+
+    table = locations.join(summary, how='inner').rename_axis('aim_id').reset_index()
+    table = table.rename(columns={'latitude': 'lat', 'longitude': 'lng'})
+    columns = ['lat', 'lng', 'avg_temp', 'aim_id', 'address'] + (['std_temp'] if include_std else [])
+    table = table[columns].astype(object)
+    return table.where(table.notna(), None).to_dict(orient='records')
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+
+DEFAULT_STORE_PATH = os.path.join("data", "temperature_cache.sqlite")
+
+
+def _to_date(value):
+    return pd.Timestamp(value).date()
+
+
+class TemperatureStore:
+    """Daily weather series keyed by (grid cell, variable, date), backed by SQLite.
+
+    Only non-null values are stored, so days the archive has not filled in yet are treated as
+    missing and fetched again on the next run.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS daily ("
+            " cell_lat REAL NOT NULL,"
+            " cell_lng REAL NOT NULL,"
+            " variable TEXT NOT NULL,"
+            " date TEXT NOT NULL,"
+            " value REAL NOT NULL,"
+            " PRIMARY KEY (cell_lat, cell_lng, variable, date)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _cell(lat, lng):
+        return round(float(lat), 6), round(float(lng), 6)
+
+    def stored_range(self, lat, lng, variables):
+        """(first, last) dates for which every variable is stored, or None if there are none."""
+        cell_lat, cell_lng = self._cell(lat, lng)
+        placeholders = ", ".join("?" for _ in variables)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(date), MAX(date) FROM ("
+                " SELECT date FROM daily"
+                f" WHERE cell_lat = ? AND cell_lng = ? AND variable IN ({placeholders})"
+                " GROUP BY date HAVING COUNT(*) = ?)",
+                (cell_lat, cell_lng, *variables, len(variables)),
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return date.fromisoformat(row[0]), date.fromisoformat(row[1])
+
+    def missing_ranges(self, lat, lng, variables, start_date, end_date):
+        """Date ranges in [start_date, end_date] before or after what is already stored for a cell."""
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        stored = self.stored_range(lat, lng, variables)
+        if stored is None:
+            return [(start_date, end_date)]
+
+        first, last = stored
+        ranges = []
+        if start_date < first:
+            ranges.append((start_date, min(end_date, first - timedelta(days=1))))
+        if last < end_date:
+            ranges.append((max(start_date, last + timedelta(days=1)), end_date))
+        return ranges
+
+    def put_frame(self, lat, lng, frame, variables):
+        """Stores the `variables` columns of a frame with a 'date' column, replacing existing values."""
+        cell_lat, cell_lng = self._cell(lat, lng)
+        long = frame.melt(id_vars='date', value_vars=variables, var_name='variable').dropna(subset=['value'])
+        rows = [
+            (cell_lat, cell_lng, variable, _to_date(day).isoformat(), float(value))
+            for day, variable, value in long[['date', 'variable', 'value']].itertuples(index=False)
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO daily (cell_lat, cell_lng, variable, date, value) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        return len(rows)
+
+    def get_frame(self, lat, lng, variables, start_date, end_date):
+        """Returns a frame with 'date' and one column per variable for the range, sorted by date."""
+        cell_lat, cell_lng = self._cell(lat, lng)
+        placeholders = ", ".join("?" for _ in variables)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, variable, value FROM daily"
+                f" WHERE cell_lat = ? AND cell_lng = ? AND variable IN ({placeholders}) AND date BETWEEN ? AND ?",
+                (cell_lat, cell_lng, *variables, _to_date(start_date).isoformat(), _to_date(end_date).isoformat()),
+            ).fetchall()
+        if not rows:
+            return pd.DataFrame(columns=['date'] + list(variables))
+        long = pd.DataFrame(rows, columns=['date', 'variable', 'value'])
+        frame = long.pivot(index='date', columns='variable', values='value').reindex(columns=variables)
+        frame = frame.sort_index().reset_index()
+        frame['date'] = pd.to_datetime(frame['date'])
+        frame.columns.name = None
+        return frame[['date'] + list(variables)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def fetch_with_store(store, lat, lng, start_date, end_date, variables, fetch):
+    """Returns the daily series for a cell, fetching only the dates the store does not hold yet.
+
+    `fetch(lat, lng, start_date, end_date)` must return a frame with 'date' and the `variables`
+    columns, or None. Returns None if nothing is available for the range.
+    """
+    for gap_start, gap_end in store.missing_ranges(lat, lng, variables, start_date, end_date):
+        print(f"Fetching {gap_start} to {gap_end} for grid cell {lat}, {lng}")
+        df = fetch(lat, lng, gap_start.isoformat(), gap_end.isoformat())
+        if df is not None:
+            store.put_frame(lat, lng, df, variables)
+
+    frame = store.get_frame(lat, lng, variables, start_date, end_date)
+    return frame if not frame.empty else None
+
+
+def store_from_config(config):
+    """Opens the store named by `temperature_cache` in config.yaml, or returns None if none is configured."""
+    path = (config or {}).get('temperature_cache')
+    return TemperatureStore(path) if path else None
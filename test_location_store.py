@@ -0,0 +1,26 @@
+import pytest
+
+from location_store import LocationStore
+
+
+@pytest.fixture(params=[True, False], ids=["rtree", "lat_lng_index"])
+def store(request, tmp_path):
+    location_store = LocationStore(str(tmp_path / "locations.sqlite"))
+    if not request.param:
+        location_store.has_rtree = False
+    elif not location_store.has_rtree:
+        pytest.skip("SQLite build has no R-tree module")
+    yield location_store
+    location_store.close()
+
+
+def test_query_bbox_includes_points_on_the_edge(store):
+    store.add_many([
+        ("Aim 1", "On the edge", 54.975056, -1.591944),
+        ("Aim 2", "Just inside", 54.975055, -1.591943),
+        ("Aim 3", "Just outside", 54.975057, -1.591944),
+    ])
+
+    found = store.query_bbox(54.9, -1.591944, 54.975056, -1.5)
+
+    assert list(found) == ["Aim 1", "Aim 2"]
@@ -1,13 +1,113 @@
-from ultralytics import YOLO
+from model_registry import get_yolo_model
 import os
 from PIL import Image, ImageDraw
 import yaml
+from manifest import file_fingerprint, hash_file, hash_inputs
+
+MANIFEST_STAGE = "tree_detection"
+
+
+def _detection_key(image_path, output_dir):
+    return f"{os.path.abspath(image_path)} -> {os.path.abspath(output_dir)}"
+
+
+def _detection_digest(image_path, model_path, confidence_threshold):
+    return hash_inputs(hash_file(image_path), file_fingerprint(model_path), float(confidence_threshold))
+
+
+def _is_detection_current(manifest, image_path, model_path, output_dir, confidence_threshold):
+    """Returns (is_current, digest) for an image against the manifest; digest is None without a manifest."""
+    if manifest is None:
+        return False, None
+    digest = _detection_digest(image_path, model_path, confidence_threshold)
+    if manifest.is_current(MANIFEST_STAGE, _detection_key(image_path, output_dir), digest):
+        print(f"Skipping {image_path}: detections are up to date")
+        return True, digest
+    return False, digest
+
+
+def _save_tree_detections(image_path, results, names, output_dir, detected_image=None):
+    """Draws the tree boxes of one YOLO result onto the image and saves it alongside a detections YAML.
+
+    Returns the paths written.
+    """
+    tree_detections_data = []
+    written = []
+
+    if results:
+        boxes = results.boxes
+
+        if detected_image is None:
+            detected_image = Image.open(image_path).convert("RGB")
+        draw = ImageDraw.Draw(detected_image)
+
+        tree_detected_count = 0
+
+        if boxes:
+            xyxy = boxes.xyxy.tolist()
+            confidences = boxes.conf.tolist()
+            class_ids = boxes.cls.int().tolist()
+
+            for i in range(len(xyxy)):
+                x1, y1, x2, y2 = map(int, xyxy[i])
+                confidence = confidences[i]
+                class_id = class_ids[i]
+                class_name = names[class_id]
+
+                if class_name == 'tree':
+                    tree_detected_count += 1
+                    label = f"{class_name}Tree_{confidence:.2f}"
+                    draw.rectangle([(x1, y1), (x2, y2)], outline="green", width=2)
+                    draw.text((x1, y2 + 5), label, fill="blue")
+
+                    
+                    tree_data = {
+                        "class_name": class_name,
+                        "confidence": float(confidence), 
+                        "xh": int(x1), 
+                        "yh": int(y1),
+                        "xw": int(x2),
+                        "yw": int(y2),
+                    }
+                    tree_detections_data.append(tree_data)
+                    print(f"  Detected Tree Coordinates (xh, yh, xw, yw): x1={x1}, y1={y1}, x2={x2}, y2={y2}")
+
+
+        if tree_detected_count > 0:
+            print(f"Detected {tree_detected_count} trees in {image_path}")
+        else:
+            print(f"No trees detected in {image_path}")
+
+        output_path = os.path.join(output_dir, os.path.basename(image_path))
+        os.makedirs(output_dir, exist_ok=True)
+        detected_image.save(output_path)
+        written.append(output_path)
+        print(f"Image with tree detections saved to: {output_path}")
 
-def run_tree_detection_yolo_class(image_path, model_path, output_dir="detected_trees_output_yolo_class", confidence_threshold=0.25):
-    """Detects trees in an image using the YOLO class, saves output image and detection coordinates to YAML."""
-    try:
         
-        model = YOLO(model_path)
+        if tree_detections_data: 
+            yaml_filename = os.path.splitext(os.path.basename(image_path))[0] + "_tree_detections.yaml"
+            yaml_filepath = os.path.join(output_dir, yaml_filename)
+            with open(yaml_filepath, 'w') as yaml_file:
+                yaml.dump(tree_detections_data, yaml_file, indent=2) 
+            written.append(yaml_filepath)
+            print(f"Tree detection coordinates saved to YAML: {yaml_filepath}")
+
+    return written
+
+
+def run_tree_detection_yolo_class(image_path, model_path, output_dir="detected_trees_output_yolo_class", confidence_threshold=0.25, device=None, manifest=None):
+    """Detects trees in an image using the YOLO class, saves output image and detection coordinates to YAML.
+
+    With a manifest, the image is skipped when its bytes, the model checkpoint and the threshold
+    are unchanged since the last run; the caller is responsible for manifest.save().
+    """
+    try:
+        current, digest = _is_detection_current(manifest, image_path, model_path, output_dir, confidence_threshold)
+        if current:
+            return
+
+        model = get_yolo_model(model_path, device)
 
         
         results = model.predict(
@@ -16,79 +116,91 @@ def run_tree_detection_yolo_class(image_path, model_path, output_dir="detected_t
             save=False,
             save_txt=False,
             save_conf=True,
+            device=device,
         )[0]
 
-        tree_detections_data = [] 
+        written = _save_tree_detections(image_path, results, model.names, output_dir)
+        if manifest is not None:
+            manifest.record(MANIFEST_STAGE, _detection_key(image_path, output_dir), digest, written)
 
-        
-        if results:
-            boxes = results.boxes
-            names = model.names
+    except Exception as e:
+        print(f"Error during tree detection: {e}")
 
-            detected_image = Image.open(image_path).convert("RGB")
-            draw = ImageDraw.Draw(detected_image)
-
-            tree_detected_count = 0
-
-            if boxes:
-                xyxy = boxes.xyxy.tolist()
-                confidences = boxes.conf.tolist()
-                class_ids = boxes.cls.int().tolist()
-
-                for i in range(len(xyxy)):
-                    x1, y1, x2, y2 = map(int, xyxy[i])
-                    confidence = confidences[i]
-                    class_id = class_ids[i]
-                    class_name = names[class_id]
-
-                    if class_name == 'tree':
-                        tree_detected_count += 1
-                        label = f"{class_name}Tree_{confidence:.2f}"
-                        draw.rectangle([(x1, y1), (x2, y2)], outline="green", width=2)
-                        draw.text((x1, y2 + 5), label, fill="blue")
-
-                        
-                        tree_data = {
-                            "class_name": class_name,
-                            "confidence": float(confidence), 
-                            "xh": int(x1), 
-                            "yh": int(y1),
-                            "xw": int(x2),
-                            "yw": int(y2),
-                        }
-                        tree_detections_data.append(tree_data)
-                        print(f"  Detected Tree Coordinates (xh, yh, xw, yw): x1={x1}, y1={y1}, x2={x2}, y2={y2}")
-
-
-            if tree_detected_count > 0:
-                print(f"Detected {tree_detected_count} trees in {image_path}")
-            else:
-                print(f"No trees detected in {image_path}")
-
-            output_path = os.path.join(output_dir, os.path.basename(image_path))
-            os.makedirs(output_dir, exist_ok=True)
-            detected_image.save(output_path)
-            print(f"Image with tree detections saved to: {output_path}")
-
-            
-            if tree_detections_data: 
-                yaml_filename = os.path.splitext(os.path.basename(image_path))[0] + "_tree_detections.yaml"
-                yaml_filepath = os.path.join(output_dir, yaml_filename)
-                with open(yaml_filepath, 'w') as yaml_file:
-                    yaml.dump(tree_detections_data, yaml_file, indent=2) 
-                print(f"Tree detection coordinates saved to YAML: {yaml_filepath}")
 
+def run_tree_detection_batch(image_paths, model_path, output_dir="detected_trees_output_yolo_class", confidence_threshold=0.25, device=None, batch_size=8, manifest=None):
+    """Detects trees in a list of images with one YOLO predict call per batch, saving the same outputs as the single-image path."""
+    digests = {}
+    if manifest is not None:
+        pending = []
+        for image_path in image_paths:
+            current, digests[image_path] = _is_detection_current(manifest, image_path, model_path, output_dir, confidence_threshold)
+            if not current:
+                pending.append(image_path)
+        image_paths = pending
+        if not image_paths:
+            return
 
+    try:
+        model = get_yolo_model(model_path, device)
     except Exception as e:
-        print(f"Error during tree detection: {e}")
+        print(f"Error loading YOLO model: {e}")
+        return
+
+    for start in range(0, len(image_paths), batch_size):
+        batch_paths = []
+        batch_images = []
+        for image_path in image_paths[start:start + batch_size]:
+            try:
+                batch_images.append(Image.open(image_path).convert("RGB"))
+                batch_paths.append(image_path)
+            except Exception as e:
+                print(f"Error loading image {image_path}: {e}")
+
+        if not batch_images:
+            continue
+
+        try:
+            batch_results = model.predict(
+                source=batch_images,
+                conf=confidence_threshold,
+                save=False,
+                save_txt=False,
+                save_conf=True,
+                device=device,
+            )
+        except Exception as e:
+            print(f"Error during batched tree detection: {e}")
+            continue
+
+        for image_path, image, results in zip(batch_paths, batch_images, batch_results):
+            try:
+                written = _save_tree_detections(image_path, results, model.names, output_dir, detected_image=image)
+                if manifest is not None:
+                    manifest.record(MANIFEST_STAGE, _detection_key(image_path, output_dir), digests[image_path], written)
+            except Exception as e:
+                print(f"Error saving tree detections for {image_path}: {e}")
+
+    if manifest is not None:
+        manifest.save()
+
+
+def process_images_in_folder(folder_path, model_path, output_dir="detected_trees_output_yolo_class", confidence_threshold=0.25, device=None, batch_size=1, manifest=None):
+    """Processes all images in a folder to detect trees and save the results in a different folder."""
+    image_paths = [
+        os.path.join(folder_path, filename)
+        for filename in os.listdir(folder_path)
+        if filename.endswith(".jpg") or filename.endswith(".png")
+    ]
 
+    if batch_size > 1:
+        run_tree_detection_batch(image_paths, model_path, output_dir, confidence_threshold, device, batch_size, manifest)
+        return
 
-def process_images_in_folder(folder_path, model_path, output_dir="detected_trees_output_yolo_class", confidence_threshold=0.25):
-    """Processes all images in a folder to detect trees and save the results in a different folder."""
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".jpg") or filename.endswith(".png"):
-            image_path = os.path.join(folder_path, filename)
-            run_tree_detection_yolo_class(image_path, model_path, output_dir, confidence_threshold)
+    for image_path in image_paths:
+        run_tree_detection_yolo_class(image_path, model_path, output_dir, confidence_threshold, device, manifest)
+
+    if manifest is not None:
+        manifest.save()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,247 @@
+import calendar
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+import requests
+
+from download_engine import create_session
+from weather_grid import WWO_GRID_DEG, group_points_by_cell
+
+WWO_PAST_WEATHER_URL = "http://api.worldweatheronline.com/premium/v1/past-weather.ashx"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_with_retry(session, url, params, retries=3, backoff=1.0, timeout=30, bucket=None):
+    """GET with exponential backoff on connection errors and 429/5xx responses."""
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return response
+            error = requests.exceptions.HTTPError(f"{response.status_code} from {url}", response=response)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+        if attempt == retries:
+            raise error
+        time.sleep(backoff * (2 ** attempt))
+
+
+def wwo_date_for_year(year):
+    """The same calendar day as today in `year`, as the heatmap scripts have always sampled.
+
+    On 29 February, non-leap years fall back to the 28th.
+    """
+    today = datetime.now()
+    day = today.day
+    if today.month == 2 and day == 29 and not calendar.isleap(int(year)):
+        day = 28
+    return f"{year}-{today.month:02d}-{day:02d}"
+
+
+def wwo_window_for_year(year, days=1):
+    """(start, end) dates of the `days`-long window ending on today's calendar day in `year`."""
+    end = date.fromisoformat(wwo_date_for_year(year))
+    return end - timedelta(days=days - 1), end
+
+
+def split_date_range(start_date, end_date):
+    """Splits an inclusive date range into (start, end) chunks that never cross a calendar month.
+
+    Past-weather requests must keep `date` and `enddate` within the same month, so this is the
+    longest span a single request can cover.
+    """
+    start_date = date.fromisoformat(str(start_date))
+    end_date = date.fromisoformat(str(end_date))
+    chunks = []
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        next_month = (chunk_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        chunk_end = min(end_date, next_month - timedelta(days=1))
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+def parse_wwo_daily_temperatures(data):
+    """Daily rows (date, avg/max/min temperature) from a past-weather response."""
+    if not data or 'weather' not in data['data']:
+        return []
+    return [
+        {
+            'date': day['date'],
+            'avg_temperature': float(day['avgtempC']),
+            'max_temperature': float(day['maxtempC']),
+            'min_temperature': float(day['mintempC']),
+        }
+        for day in data['data']['weather']
+    ]
+
+
+def fetch_wwo_daily_temperatures(latitude, longitude, start_date, end_date, api_key, session=None,
+                                 base_url=WWO_PAST_WEATHER_URL, bucket=None, retries=3, backoff=1.0):
+    """Requests daily temperatures for one point over a date range, one request per calendar month.
+
+    Raises on network or parse errors.
+    """
+    rows = []
+    for chunk_start, chunk_end in split_date_range(start_date, end_date):
+        params = {
+            "key": api_key,
+            "q": f"{latitude},{longitude}",
+            "format": "json",
+            "date": chunk_start.isoformat(),
+            "enddate": chunk_end.isoformat(),
+            "tp": 24
+        }
+        response = get_with_retry(session or requests, base_url, params, retries=retries, backoff=backoff,
+                                  bucket=bucket)
+        rows.extend(parse_wwo_daily_temperatures(response.json()))
+    return rows
+
+
+class HistoricalTemperatureFetcher:
+    """Fetches temperatures for many points across several years concurrently.
+
+    Every year in `api_keys` runs against its own key, with its own token bucket, so each key's
+    quota is respected independently while all years progress at the same time. Each point costs
+    one request per calendar month of its `window_days`-long window, not one per day, and points
+    sharing a `grid_resolution` cell share those requests (pass None to query every point).
+    """
+
+    DAILY_COLUMNS = ['latitude', 'longitude', 'date', 'avg_temperature', 'max_temperature', 'min_temperature',
+                     'year', 'api_key_used']
+
+    def __init__(self, api_keys, requests_per_second=3.0, burst=3, workers_per_key=4, retries=3, backoff=1.0,
+                 base_url=WWO_PAST_WEATHER_URL, window_days=1, grid_resolution=WWO_GRID_DEG):
+        self.api_keys = api_keys
+        self.buckets = {year: TokenBucket(requests_per_second, burst) for year in api_keys}
+        self.workers_per_key = workers_per_key
+        self.retries = retries
+        self.backoff = backoff
+        self.base_url = base_url
+        self.window_days = window_days
+        self.grid_resolution = grid_resolution
+        self.session = create_session(pool_size=workers_per_key * max(1, len(api_keys)))
+
+    def _fetch_one(self, year, latitude, longitude):
+        key = self.api_keys[year]
+        try:
+            start_date, end_date = wwo_window_for_year(year, self.window_days)
+            rows = fetch_wwo_daily_temperatures(latitude, longitude, start_date, end_date, key,
+                                                session=self.session, base_url=self.base_url,
+                                                bucket=self.buckets[year], retries=self.retries,
+                                                backoff=self.backoff)
+            if not rows:
+                print(f"Warning: No historical temperature data for {latitude}, {longitude} in {year}.")
+            return rows
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching historical temperature for {latitude}, {longitude}: {e}")
+        except (KeyError, ValueError) as e:
+            print(f"Error parsing historical temperature response for {latitude}, {longitude}: {e}")
+        return []
+
+    def fetch_daily(self, points, limit_per_key=None):
+        """Returns a tidy DataFrame with one row per point, year and day (see DAILY_COLUMNS)."""
+        points = list(points)
+        if limit_per_key is not None:
+            points = points[:limit_per_key]
+
+        if self.grid_resolution:
+            cells = group_points_by_cell(points, self.grid_resolution)
+            print(f"Fetching weather for {len(cells)} grid cells covering {len(points)} points")
+        else:
+            cells = {}
+            for index, point in enumerate(points):
+                cells.setdefault(point, []).append(index)
+
+        # One pool per key, so every key's bucket is drained at the same time instead of the
+        # workers of a shared pool queueing behind the first year's bucket.
+        with ExitStack() as stack:
+            executors = {
+                year: stack.enter_context(ThreadPoolExecutor(max_workers=self.workers_per_key))
+                for year in self.api_keys
+            }
+            futures = {
+                year: [(indices, executors[year].submit(self._fetch_one, year, cell_lat, cell_lng))
+                       for (cell_lat, cell_lng), indices in cells.items()]
+                for year in self.api_keys
+            }
+            rows = []
+            for year, cell_futures in futures.items():
+                # Fan each cell's rows back out to its points, keeping the points in their original order.
+                point_rows = [None] * len(points)
+                for indices, future in cell_futures:
+                    cell_rows = future.result()
+                    for index in indices:
+                        point_rows[index] = cell_rows
+                for (lat, lng), cell_rows in zip(points, point_rows):
+                    for row in cell_rows:
+                        rows.append({
+                            'latitude': lat,
+                            'longitude': lng,
+                            **row,
+                            'year': year,
+                            'api_key_used': self.api_keys[year][-8:]
+                        })
+        return pd.DataFrame(rows, columns=self.DAILY_COLUMNS)
+
+    @staticmethod
+    def summarize(daily):
+        """Collapses a daily frame to {year: [record, ...]} of per-point window averages, in point order.
+
+        Records match the rows heatmap.py writes: latitude, longitude, avg_temperature, year, api_key_used.
+        """
+        averages = (
+            daily.groupby(['year', 'latitude', 'longitude', 'api_key_used'], sort=False)['avg_temperature']
+            .mean()
+            .reset_index()
+        )
+        records = {}
+        for record in averages.to_dict(orient='records'):
+            records.setdefault(record['year'], []).append({
+                'latitude': record['latitude'],
+                'longitude': record['longitude'],
+                'avg_temperature': record['avg_temperature'],
+                'year': record['year'],
+                'api_key_used': record['api_key_used']
+            })
+        return records
+
+    def fetch(self, points, limit_per_key=None):
+        """Returns {year: [record, ...]} of window-average temperatures for (latitude, longitude) points."""
+        records = self.summarize(self.fetch_daily(points, limit_per_key))
+        return {year: records.get(year, []) for year in self.api_keys}
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+
+# Reanalysis grid spacing, in degrees, behind each weather provider. Points that snap to the same
+# cell get identical data back, so only one request per cell is needed.
+OPEN_METEO_GRID_DEG = 0.1   # ERA5-Land, the finest model the archive API serves
+WWO_GRID_DEG = 0.25
+
+
+def snap_to_grid(latitude, longitude, resolution):
+    """Returns the (lat, lng) of the grid point nearest to a location, for a grid of `resolution` degrees."""
+    return (
+        round(round(float(latitude) / resolution) * resolution, 6),
+        round(round(float(longitude) / resolution) * resolution, 6),
+    )
+
+
+def group_points_by_cell(points, resolution):
+    """Maps each grid cell to the indices of the (lat, lng) points that fall in it, in first-seen order."""
+    cells = OrderedDict()
+    for index, (latitude, longitude) in enumerate(points):
+        cells.setdefault(snap_to_grid(latitude, longitude, resolution), []).append(index)
+    return cells
+
+
+def fetch_per_cell(points, fetch, resolution):
+    """Calls fetch(cell_lat, cell_lng) once per distinct grid cell and fans the results back out.
+
+    Returns a list aligned with `points`. Points sharing a cell share the same result object.
+    """
+    points = list(points)
+    cells = group_points_by_cell(points, resolution)
+    print(f"Fetching weather for {len(cells)} grid cells covering {len(points)} points")
+    results = [None] * len(points)
+    for (cell_lat, cell_lng), indices in cells.items():
+        result = fetch(cell_lat, cell_lng)
+        for index in indices:
+            results[index] = result
+    return results
@@ -2,8 +2,10 @@ import requests
 import os
 from PIL import Image, ImageDraw
 import yaml
-from ultralytics import YOLO
-import io
+from model_registry import get_yolo_model
+from image_cache import cache_from_config
+from jpeg_utils import parse_size, save_jpeg_bytes, save_jpeg_response
+from location_store import get_location_store
 
 CONFIG_FILE_PATH = "config.yaml"
 COORDINATES_FILE_PATH = "coordinates.yaml"
@@ -12,6 +14,8 @@ FOV = 60
 PITCH = 0
 SIZE = "600x400"
 
+STREET_VIEW_URL = "https://maps.googleapis.com/maps/api/streetview"
+
 def get_coordinates(address, api_key):
     url = f"https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={api_key}"
     response = requests.get(url)
@@ -26,15 +30,23 @@ def get_coordinates(address, api_key):
         return None, None
 
 def get_coordinates_from_yaml(yaml_file_path="coordinates.yaml"):
+    store = get_location_store(CONFIG_FILE_PATH, yaml_file_path)
     try:
-        with open(yaml_file_path, 'r') as file:
-            coordinates_data = yaml.safe_load(file)
+        if store is not None:
+            aim_1_data = store.get('Aim 1')
+            coordinates_data = {'Aim 1': aim_1_data} if aim_1_data else {}
+        else:
+            with open(yaml_file_path, 'r') as file:
+                coordinates_data = yaml.safe_load(file)
     except FileNotFoundError:
         print(f"Error: YAML file '{yaml_file_path}' not found.")
         return None, None
     except yaml.YAMLError as e:
         print(f"Error parsing YAML file '{yaml_file_path}': {e}")
         return None, None
+    finally:
+        if store is not None:
+            store.close()
 
     if coordinates_data and 'Aim 1' in coordinates_data:
         aim_1_data = coordinates_data['Aim 1']
@@ -52,16 +64,26 @@ def get_coordinates_from_yaml(yaml_file_path="coordinates.yaml"):
         print(f"Error: 'Aim 1' section or coordinate data not found in '{yaml_file_path}'.")
         return None, None
 
-def get_street_view_image(location_str, heading, api_key, output_dir, filename):
-    url = f"https://maps.googleapis.com/maps/api/streetview?size={SIZE}&location={location_str}&fov={FOV}&heading={heading}&pitch={PITCH}&key={api_key}"
-
+def get_street_view_image(location_str, heading, api_key, output_dir, filename, cache=None):
+    params = {
+        "size": SIZE,
+        "location": location_str,
+        "fov": FOV,
+        "heading": heading,
+        "pitch": PITCH,
+        "key": api_key,
+    }
+
+    image_path = os.path.join(output_dir, filename)
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
+        if cache is not None:
+            content = cache.fetch(STREET_VIEW_URL, params)
+            save_jpeg_bytes(content, image_path, expected_size=parse_size(SIZE))
+        else:
+            response = requests.get(STREET_VIEW_URL, params=params, stream=True)
+            response.raise_for_status()
+            save_jpeg_response(response, image_path, expected_size=parse_size(SIZE))
 
-        image = Image.open(io.BytesIO(response.content))
-        image_path = os.path.join(output_dir, filename)
-        image.save(image_path)
         print(f"Image saved to: {image_path}")
         return image_path
 
@@ -96,11 +118,11 @@ def create_panorama(image_paths, output_dir):
     except Exception as e:
         print(f"Error creating panorama: {e}")
 
-def run_tree_detection_yolo_class(image_path, model_path, output_dir="detected_trees_output_yolo_class", confidence_threshold=0.25):
+def run_tree_detection_yolo_class(image_path, model_path, output_dir="detected_trees_output_yolo_class", confidence_threshold=0.25, device=None):
     """Detects trees in an image using the YOLO class, saves output image and detection coordinates to YAML."""
     try:
         
-        model = YOLO(model_path)
+        model = get_yolo_model(model_path, device)
 
         
         results = model.predict(
@@ -109,6 +131,7 @@ def run_tree_detection_yolo_class(image_path, model_path, output_dir="detected_t
             save=False,
             save_txt=False,
             save_conf=True,
+            device=device,
         )[0]
 
         tree_detections_data = [] 
@@ -180,6 +203,7 @@ if __name__ == "__main__":
         with open(CONFIG_FILE_PATH, 'r') as config_file:
             config = yaml.safe_load(config_file)
             api_key = config.get('api_key')
+            image_cache = cache_from_config(config)
     except FileNotFoundError:
         print(f"Error: Configuration file '{CONFIG_FILE_PATH}' not found.")
         api_key = None
@@ -238,7 +262,7 @@ if __name__ == "__main__":
     for i in range(6):
         heading = i * FOV
         filename = f"street_view_{i}.jpg"
-        image_path = get_street_view_image(LOCATION, heading, api_key, OUTPUT_DIR, filename)
+        image_path = get_street_view_image(LOCATION, heading, api_key, OUTPUT_DIR, filename, cache=image_cache)
         image_paths.append(image_path)
 
     detected_output_dir = "detected_trees_output_yolo_class"